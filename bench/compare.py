@@ -0,0 +1,36 @@
+# Compares two runs of bench/suite.py.
+# uv run bench/compare.py bench/results/<before>.json bench/results/<after>.json [--threshold 0.1]
+import sys
+import json
+import argparse
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser()
+   parser.add_argument("before")
+   parser.add_argument("after")
+   parser.add_argument("--threshold", type=float, default=0.1, help="slowdown that counts as a regression")
+   args = parser.parse_args()
+
+   with open(args.before, encoding="utf-8") as f:
+      before = json.load(f)
+   with open(args.after, encoding="utf-8") as f:
+      after = json.load(f)
+
+   print(f"{'':<14}{before['commit']:>12}{after['commit']:>12}")
+   regressions = 0
+   for name, result in after["results"].items():
+      if name not in before["results"]:
+         print(f"{name:<14}{'':>12}{result['median'] * 1000:>10.2f}ms")
+         continue
+      old = before["results"][name]["median"]
+      new = result["median"]
+      ratio = new / old if old > 0 else float("inf")
+      flag = ""
+      if ratio > 1 + args.threshold:
+         flag = "  <- slower"
+         regressions += 1
+      elif ratio < 1 - args.threshold:
+         flag = "  faster"
+      print(f"{name:<14}{old * 1000:>10.2f}ms{new * 1000:>10.2f}ms{ratio:>8.2f}x{flag}")
+
+   sys.exit(1 if regressions > 0 else 0)
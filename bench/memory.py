@@ -0,0 +1,142 @@
+# Bytes kept alive per track by everything a run holds on to for a playlist.
+# uv run bench/memory.py [tracks]
+import os
+import sys
+import json
+import contextlib
+import random
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import synthetic
+import config
+import bridge
+import textual
+import yt
+import util as u
+
+def api_pages(tracks: int, rng: random.Random) -> list[str]:
+   """
+   playlistItems.list responses the way they come over the wire, 50 to a page.
+   """
+   channels = [synthetic.title(rng, 3, 20) for _ in range(max(1, tracks // 20))]
+   items = []
+   for position in range(tracks):
+      item = synthetic.api_item(rng, "PL" + "x" * 32, position, channels)
+      # The rest of what a full response has, which api_item leaves out.
+      item["kind"] = "youtube#playlistItem"
+      item["etag"] = synthetic.youtube_id(rng, 27)
+      item["snippet"].update({
+         "publishedAt": "2025-01-01T00:00:00Z",
+         "channelId": "UC" + synthetic.youtube_id(rng, 22),
+         "description": synthetic.title(rng, 0, 200),
+         "thumbnails": {size: {"url": f"https://i.ytimg.com/vi/{size}.jpg", "width": 120, "height": 90} for size in ("default", "medium", "high")},
+         "channelTitle": "me",
+         "videoOwnerChannelId": "UC" + synthetic.youtube_id(rng, 22),
+      })
+      item["snippet"]["resourceId"]["kind"] = "youtube#video"
+      items.append(item)
+   return [json.dumps({"items": items[i:i + 50]}, ensure_ascii=False) for i in range(0, tracks, 50)]
+
+def playlist(tracks: int) -> yt.Playlist:
+   return yt.Playlist({
+      "id": "PL" + "x" * 32,
+      "contentDetails": {"itemCount": tracks},
+      "snippet": {
+         "publishedAt": "2025-01-01T00:00:00Z",
+         "channelId": "UC",
+         "channelTitle": "me",
+         "title": "Big Playlist",
+         "description": "",
+         "thumbnails": {},
+      },
+   })
+
+def _unslotted(cls: type) -> type:
+   """
+   cls the way it was before it had __slots__, with a __dict__ per object.
+   """
+   namespace = {k: v for k, v in vars(cls).items() if k != "__slots__" and k not in cls.__slots__}
+   return type(cls.__name__, cls.__bases__, namespace)
+
+@contextlib.contextmanager
+def old_layout():
+   """
+   Per-track objects without __slots__, and nothing interned.
+   """
+   patches = [
+      (yt, "PlaylistItem", _unslotted(yt.PlaylistItem)),
+      (textual, "PlaylistItem", _unslotted(textual.PlaylistItem)),
+      (textual, "Video", _unslotted(textual.Video)),
+      (u, "intern", lambda s: s),
+      (u, "intern_column", list),
+      (textual, "_intern_columns", lambda *columns: tuple(map(list, columns))),
+   ]
+   saved = [(module, name, getattr(module, name)) for module, name, _ in patches]
+   for module, name, value in patches:
+      setattr(module, name, value)
+   try:
+      yield
+   finally:
+      for module, name, value in saved:
+         setattr(module, name, value)
+
+def measure(tracks: int, pages: list[str]) -> list[tuple[str, int]]:
+   """
+   Bytes allocated by every stage of loading a playlist and diffing it, in order.
+   """
+   # Both logs belong to whichever PLAYLISTS_PATH was first.
+   for cached in (bridge._videos_file, bridge.videos, bridge._index_file, bridge.playlist_index):
+      cached.cache_clear()
+
+   with tempfile.TemporaryDirectory() as path:
+      config.PLAYLISTS_PATH = path
+
+      tracemalloc.start()
+      stages = []
+      def stage(name: str):
+         stages.append((name, tracemalloc.get_traced_memory()[0]))
+
+      stage("start")
+      yt_playlist = playlist(tracks)
+      yt_playlist.items = [yt.PlaylistItem(item) for page in pages for item in json.loads(page)["items"]]
+      stage("yt.PlaylistItem")
+
+      videos = textual.Videos(yt_playlist.items)
+      stage("textual.Video")
+
+      shadow_path = f"{path}/Big Playlist.jsonl"
+      with open(shadow_path, "w", encoding="utf-8") as f:
+         textual.Playlist(yt_playlist).write_jsonl(f)
+      stage("(written)")
+
+      p = bridge.Playlist(yt_playlist=yt_playlist, playlist_filepath=shadow_path)
+      stage("textual.PlaylistItem")
+
+      p.missing_from_shadow
+      stage("bridge diff")
+      tracemalloc.stop()
+      p.close()
+      del videos
+
+   per_stage = [(name, after - before) for (_, before), (name, after) in zip(stages, stages[1:]) if not name.startswith("(")]
+   return per_stage + [("total", stages[-1][1] - stages[0][1])]
+
+if __name__ == "__main__":
+   tracks = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+   pages = api_pages(tracks, random.Random(0))
+
+   # Whatever gets cached once per process isn't per track.
+   measure(tracks, pages)
+   with old_layout():
+      before = measure(tracks, pages)
+   after = measure(tracks, pages)
+
+   # before is without __slots__ and interning. What else bridge saves, like
+   # sharing smols with the shadow, is in both.
+   print(f"{tracks} tracks, bytes per track")
+   print(f"{'':<22}{'before':>8}{'after':>8}")
+   for (name, old), (_, new) in zip(before, after):
+      print(f"{name:<22}{old / tracks:>8.0f}{new / tracks:>8.0f}")
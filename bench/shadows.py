@@ -0,0 +1,72 @@
+# Loading every shadow file with and without .parsed/.
+# uv run bench/shadows.py [playlists] [items per playlist]
+import os
+import sys
+import glob
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import synthetic
+import config
+import shadowcache
+import textual
+import util as u
+
+# Most of a library comes from a few artists.
+_rng = random.Random(0)
+CHANNELS = [synthetic.title(_rng, 3, 20) for _ in range(500)]
+
+def shadow(i: int, items: int, rng: random.Random) -> str:
+   return textual.Playlist({
+      "title": f"Playlist {i}",
+      "playlist_comment": [],
+      "id": f"PL{i:032}",
+      "time": 11102.0,
+      "friendly_titles": [synthetic.title(rng, 5, 40) for _ in range(items)],
+      "friendly_channel_titles": [rng.choice(CHANNELS) for _ in range(items)],
+      "video_ids": [synthetic.youtube_id(rng, 11) for _ in range(items)],
+      "smol_hashes": [synthetic.youtube_id(rng, 10) for _ in range(items)],
+      "above_comments": [["// hmm"] if rng.random() < 0.01 else [] for _ in range(items)],
+      "inline_comments": ["" for _ in range(items)],
+   }).jsonl()
+
+def load_all(files: list) -> float:
+   start = time.perf_counter()
+   for f in files:
+      shadowcache.parse(f)
+   return time.perf_counter() - start
+
+if __name__ == "__main__":
+   playlists = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+   items = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+   runs = 5
+   rng = random.Random(0)
+
+   with tempfile.TemporaryDirectory() as path:
+      config.PLAYLISTS_PATH = path
+      files = []
+      for i in range(playlists):
+         f = u.oopen(f"{path}/Playlist {i}.jsonl")
+         f.write(shadow(i, items, rng))
+         f.flush()
+         files.append(f)
+
+      cold = []
+      for _ in range(runs):
+         shutil.rmtree(f"{path}/.parsed", ignore_errors=True)
+         cold.append(load_all(files))
+      warm = [load_all(files) for _ in range(runs)]
+
+      shadows = sum(os.path.getsize(f.name) for f in files)
+      parsed = sum(map(os.path.getsize, glob.glob(f"{path}/.parsed/*")))
+      for f in files:
+         f.close()
+
+   print(f"{playlists} playlists x {items} items, {shadows / 2**20:.1f} MiB of shadows, {parsed / 2**20:.1f} MiB parsed")
+   print(f"cold (parse + save) {statistics.median(cold) * 1000:>8.1f} ms")
+   print(f"warm (cache)        {statistics.median(warm) * 1000:>8.1f} ms")
@@ -0,0 +1,33 @@
+# How long it takes from starting Python until main.py could show its menu.
+# uv run bench/startup.py
+import os
+import sys
+import statistics
+import subprocess
+import tempfile
+import time
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# Importing main does everything up to the menu without showing it.
+TO_MENU = f"import sys; sys.path.insert(0, {SRC!r}); import main"
+
+def time_to_menu() -> float:
+   # Run somewhere without secrets/ so that anything trying to log in at
+   # import time blows up instead of quietly being fast.
+   with tempfile.TemporaryDirectory() as cwd:
+      start = time.perf_counter()
+      subprocess.run([sys.executable, "-c", TO_MENU], cwd=cwd, check=True, capture_output=True)
+      return time.perf_counter() - start
+
+def time_to_interpreter() -> float:
+   start = time.perf_counter()
+   subprocess.run([sys.executable, "-c", "pass"], check=True)
+   return time.perf_counter() - start
+
+if __name__ == "__main__":
+   runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+   interpreter = statistics.median(time_to_interpreter() for _ in range(runs))
+   menu = statistics.median(time_to_menu() for _ in range(runs))
+   print(f"interpreter  {interpreter * 1000:>7.1f} ms")
+   print(f"time-to-menu {menu * 1000:>7.1f} ms")
@@ -0,0 +1,134 @@
+# Times the offline parts of a run at playlist sizes YouTube actually allows,
+# and writes the results as JSON so that commits can be compared with
+# bench/compare.py.
+# uv run bench/suite.py [--out bench/results/<commit>.json] [--runs 7] [--sizes 50,500,5000]
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import typing as t
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import synthetic
+import config
+import bridge
+import textual
+import util as u
+import log as l
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+def _commit() -> str:
+   try:
+      return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, check=True, capture_output=True, text=True).stdout.strip()
+   except (OSError, subprocess.CalledProcessError):
+      return "unknown"
+
+def measure(runs: int, setup: t.Callable[[], t.Any], run: t.Callable[[t.Any], t.Any]) -> dict[str, float]:
+   """
+   Seconds that run(setup()) takes, setup not included.
+   """
+   times = []
+   for _ in range(runs):
+      state = setup()
+      start = time.perf_counter()
+      run(state)
+      times.append(time.perf_counter() - start)
+   return {"median": statistics.median(times), "min": min(times), "runs": runs}
+
+class Sized:
+   """
+   Everything the benchmarks need for one playlist size.
+   """
+
+   def __init__(self, youtube: synthetic.YouTube, size: int):
+      self.youtube = youtube
+      self.size = size
+      self.id = youtube.add(size)
+      self.yt_playlist = youtube.get_playlist(self.id)
+      self.shadow = synthetic.shadow_jsonl(textual.Playlist(self.yt_playlist), random.Random(size))
+      self.path = f"{config.PLAYLISTS_PATH}/Playlist {size}.jsonl"
+
+      # Somebody shuffled the shadow around a bit.
+      shuffled = textual.Playlist(self.shadow)
+      rng = random.Random(size)
+      for _ in range(max(1, size // 20)):
+         i, j = rng.randrange(size), rng.randrange(size)
+         shuffled.items.insert(j, shuffled.items.pop(i))
+      self.shuffled = shuffled.jsonl()
+
+      # ...and YouTube got tracks that the shadow doesn't have yet.
+      behind = textual.Playlist(self.shadow)
+      behind.items = [item for i, item in enumerate(behind.items) if i % 10 != 3]
+      self.behind = behind.jsonl()
+
+   def bridge_playlist(self, shadow: str) -> bridge.Playlist:
+      with open(self.path, "w", encoding="utf-8") as f:
+         f.write(shadow)
+      p = bridge.Playlist(yt_playlist=self.youtube.get_playlist(self.id), playlist_filepath=self.path)
+      # Logging videos and saving the snapshot happens on first use.
+      p.yt_playlist
+      return p
+
+def run_suite(sizes: list[int], runs: int) -> dict[str, dict[str, float]]:
+   youtube = synthetic.YouTube()
+   youtube.install()
+   results: dict[str, dict[str, float]] = {}
+
+   for size in sizes:
+      s = Sized(youtube, size)
+      parsed = textual.Playlist(s.shadow)
+      permutation = list(range(size))
+      random.Random(size).shuffle(permutation)
+
+      def close(p: bridge.Playlist):
+         p.close()
+
+      benches: dict[str, tuple[t.Callable[[], t.Any], t.Callable[[t.Any], t.Any]]] = {
+         "parse": (lambda: s.shadow, textual.Playlist),
+         "jsonl": (lambda: parsed, textual.Playlist.jsonl),
+         "lis": (lambda: permutation, u.longest_increasing_subsequence),
+         "diff": (lambda: s.bridge_playlist(s.shuffled), lambda p: (p._init_diff(), p.ooo, close(p))),
+         "ingest": (lambda: s.bridge_playlist(s.behind), lambda p: (p.ingest_new_yt(), close(p))),
+         "reset": (lambda: s.bridge_playlist(s.shuffled), lambda p: (p.reset_to_yt(), close(p))),
+      }
+      for name, (setup, run) in benches.items():
+         results[f"{name}/{size}"] = measure(runs, setup, run)
+         print(f"{name + '/' + str(size):<14}{results[f'{name}/{size}']['median'] * 1000:>10.2f} ms", file=sys.stderr)
+
+   return results
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser()
+   parser.add_argument("--out", default=None, help="defaults to bench/results/<commit>.json")
+   parser.add_argument("--runs", type=int, default=7)
+   parser.add_argument("--sizes", default="50,500,5000")
+   args = parser.parse_args()
+
+   # ingest talks about every track it adds.
+   l.info = lambda v: None
+
+   commit = _commit()
+   with tempfile.TemporaryDirectory() as path:
+      config.PLAYLISTS_PATH = path
+      config.OFFLINE = True
+      results = run_suite([int(size) for size in args.sizes.split(",")], args.runs)
+
+   out = args.out or os.path.join(ROOT, "bench", "results", f"{commit}.json")
+   os.makedirs(os.path.dirname(out), exist_ok=True)
+   with open(out, "w", encoding="utf-8") as f:
+      json.dump({
+         "commit": commit,
+         "time": time.time(),
+         "python": platform.python_version(),
+         "machine": platform.machine(),
+         "results": results,
+      }, f, indent=3)
+   print(out)
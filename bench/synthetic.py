@@ -0,0 +1,113 @@
+# Made-up playlists that look like the real thing, and a YouTube that only
+# lives in memory, for the benchmarks.
+import os
+import sys
+import random
+import typing as t
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import textual
+import yt
+
+ID_ALPHABET = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_"
+
+# What titles are actually made of. Weighted towards plain ASCII, but with
+# plenty of wide characters, combining marks and emoji, since those are what
+# make width calculations slow.
+SCRIPTS = [
+   (60, "abcdefghijklmnopqrstuvwxyz ABCDEFGHIJKLMNOPQRSTUVWXYZ 0123456789 ()[]-'&.,!"),
+   (10, "àáâãäåèéêëìíîïñòóôõöùúûüýÿçœßøæ"),
+   (10, "あいうえおかきくけこさしすせそたちつてとなにぬねのアイウエオカキクケコ夜空星光雨"),
+   (8, "가나다라마바사아자차카타파하눈꽃사랑별바다"),
+   (5, "абвгдежзийклмнопрстуфхцчшщъыьэюя"),
+   (4, "éäô"),
+   (3, "🎵🔥💜✨🌙🎧"),
+]
+
+def _pick_script(rng: random.Random) -> str:
+   return rng.choices([chars for _, chars in SCRIPTS], weights=[weight for weight, _ in SCRIPTS])[0]
+
+def title(rng: random.Random, low: int = 5, high: int = 70) -> str:
+   """
+   Mostly one script, now and then a run of another, like "夜に駆ける (YOASOBI Cover) 🎵".
+   """
+   out = []
+   n = rng.randint(low, high)
+   chars = _pick_script(rng)
+   while len(out) < n:
+      if rng.random() < 0.1:
+         chars = _pick_script(rng)
+      out.append(rng.choice(chars))
+   return "".join(out).strip() or "untitled"
+
+def youtube_id(rng: random.Random, n: int) -> str:
+   return "".join(rng.choice(ID_ALPHABET) for _ in range(n))
+
+def api_item(rng: random.Random, playlist_id: str, position: int, channels: list[str]) -> dict[str, t.Any]:
+   return {
+      "id": youtube_id(rng, 68),
+      "snippet": {
+         "title": title(rng),
+         "position": position,
+         "playlistId": playlist_id,
+         "resourceId": {"videoId": youtube_id(rng, 11)},
+         "videoOwnerChannelTitle": rng.choice(channels),
+      },
+   }
+
+def api_playlist(playlist_id: str, length: int) -> dict[str, t.Any]:
+   return {
+      "id": playlist_id,
+      "etag": "etag",
+      "contentDetails": {"itemCount": length},
+      "snippet": {
+         "publishedAt": "2025-01-01T00:00:00Z",
+         "channelId": "UC",
+         "channelTitle": "me",
+         "title": f"Playlist {playlist_id}",
+         "description": "",
+         "thumbnails": {},
+      },
+   }
+
+def comment(rng: random.Random) -> str:
+   return "// " + title(rng, 3, 40)
+
+def shadow_jsonl(playlist: textual.Playlist, rng: random.Random) -> str:
+   """
+   The jsonl of playlist after someone has been at it with comments: one in
+   twenty tracks gets a comment above it, one in fifty one after it.
+   """
+   for item in playlist.items:
+      if rng.random() < 0.05:
+         item.above_comment = [comment(rng) for _ in range(rng.randint(1, 3))]
+      if rng.random() < 0.02:
+         item.inline_comment = " " + comment(rng)
+   playlist.playlist_comment = [comment(rng)]
+   return playlist.jsonl()
+
+class YouTube:
+   """
+   Playlists kept in memory and handed out through yt.get_playlist, so that
+   nothing in bridge ever notices it isn't talking to YouTube.
+   """
+
+   def __init__(self, seed: int = 0):
+      self.rng = random.Random(seed)
+      self.channels = [title(self.rng, 3, 20) for _ in range(300)]
+      self.playlists: dict[str, list[dict[str, t.Any]]] = {}
+
+   def add(self, length: int) -> str:
+      playlist_id = f"PL{len(self.playlists):032}"
+      self.playlists[playlist_id] = [api_item(self.rng, playlist_id, i, self.channels) for i in range(length)]
+      return playlist_id
+
+   def get_playlist(self, playlist_id: str) -> yt.Playlist:
+      items = self.playlists[playlist_id]
+      playlist = yt.Playlist(api_playlist(playlist_id, len(items)))
+      playlist.items = [yt.PlaylistItem(item) for item in items]
+      return playlist
+
+   def install(self):
+      yt.get_playlist = self.get_playlist
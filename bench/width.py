@@ -0,0 +1,50 @@
+# Microbenchmark for util.better_width / util.truncate.
+# uv run bench/width.py
+import os
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import wcwidth
+import util as u
+
+def wcwidth_better_width(s: str) -> int:
+   length = 0.0
+   for c in s:
+      w = wcwidth.wcwidth(c)
+      if w == 1:
+         length += 1
+      else:
+         length += w * 0.9
+   return int(length)
+
+def wcwidth_truncate(s: str, max_len: int) -> str:
+   if wcwidth_better_width(s) <= max_len:
+      return s
+   while wcwidth_better_width(s) > max_len - 1:
+      s = s[:-1]
+   return s + "…"
+
+def titles(alphabet: str, n: int = 2000) -> list[str]:
+   rng = random.Random(0)
+   return ["".join(rng.choice(alphabet) for _ in range(rng.randint(20, 90))) for _ in range(n)]
+
+CORPORA = {
+   "ascii": titles("abcdefghijklmnopqrstuvwxyz ABCDEFGHIJKLMNOPQRSTUVWXYZ()-'"),
+   "cjk": titles("光の速さで恋をしたアニメ主題歌한국어노래 (Official MV) 【歌ってみた】"),
+   "emoji": titles("🎵🔥💖✨👍🏽🌸🎧🥺 lofi beats ｆｕｌｌ ver."),
+}
+
+def bench(label: str, fn, corpus: list[str]):
+   seconds = min(timeit.repeat(lambda: [fn(s) for s in corpus], number=1, repeat=5))
+   print(f"{label:<28} {seconds * 1e6 / len(corpus):>9.2f} µs/title")
+
+if __name__ == "__main__":
+   for name, corpus in CORPORA.items():
+      print(f"[{name}]")
+      bench("wcwidth better_width", wcwidth_better_width, corpus)
+      bench("table better_width", u.better_width, corpus)
+      bench("wcwidth truncate(40)", lambda s: wcwidth_truncate(s, 40), corpus)
+      bench("table truncate(40)", lambda s: u.truncate(s, 40), corpus)
@@ -4,25 +4,67 @@ import typing as t
 import textual
 import util as u
 import yt
+import plan
+import index
+import journal
+import snapshot
+import shadowcache
+import quota
 import config
 import os
 import log as l
+import spans
 
 from pathvalidate import sanitize_filename
-from functools import cached_property
+from functools import cache, cached_property
+from concurrent.futures import ThreadPoolExecutor
+
+@spans.traced
+def _write_log(f: t.Any, log: t.Union[textual.Videos, index.Index], garbage_ratio: float):
+   if log.garbage_ratio >= garbage_ratio:
+      u.overwrite(f, log.compact_jsonl())
+   else:
+      f.seek(0, os.SEEK_END)
+      f.write(log.pending_jsonl())
+   f.flush()
+
+# Neither log is read until something needs it.
+@cache
+def _videos_file() -> t.TextIO:
+   return u.oopen(f"{config.PLAYLISTS_PATH}/.videos.jsonl")
+
+@cache
+def videos() -> textual.Videos:
+   return textual.Videos(_videos_file().read())
 
-videos_file = u.oopen(f"{config.PLAYLISTS_PATH}/.videos.jsonl")
-videos_file_object = textual.Videos(videos_file.read())
 def write_videos():
-   videos_file.write(videos_file_object.jsonl())
+   _write_log(_videos_file(), videos(), config.VIDEOS_GARBAGE_RATIO)
+
+@cache
+def _index_file() -> t.TextIO:
+   return u.oopen(f"{config.PLAYLISTS_PATH}/.index.jsonl")
+
+@cache
+def playlist_index() -> index.Index:
+   return index.Index(_index_file().read())
+
+def write_index():
+   _write_log(_index_file(), playlist_index(), config.INDEX_GARBAGE_RATIO)
 
 class Playlist:
    def __init__(self, *,
                 yt_playlist: t.Optional[yt.Playlist] = None,
                 playlist_filepath: t.Optional[str] = None,
+                from_snapshot: bool = False,
                ):
       self.id: str
       self._yt_playlist: t.Optional[yt.Playlist] = None
+      self._yt_is_live = yt_playlist is not None and not from_snapshot
+      """
+      Whether _yt_playlist came from YouTube during this run rather than a
+      snapshot. Not if only the items are a snapshot's, see _reuse_snapshot.
+      """
+      self._saved_live = False
       self.shadow_file_object: textual.Playlist
 
       if yt_playlist is None and playlist_filepath is None:
@@ -39,7 +81,7 @@ class Playlist:
 
       try:
          # TODO
-         self.shadow_file_object = textual.Playlist(self.shadow_file.read())
+         self.shadow_file_object = shadowcache.parse(self.shadow_file)
       except Exception as e:
          l.warn(e)
          # Couldn't parse the shadow file. Let's write another one.
@@ -47,6 +89,9 @@ class Playlist:
          self.shadow_file_object = textual.Playlist(self.yt_playlist)
          self.write()
 
+      if playlist_index().update(self.shadow_file_object):
+         write_index()
+
       # these type errors were put here by the MAD DEADLY WORLDWIDE COMMUNIST GANGSTER COMPUTER GOD
       self._should_diff = True
       self._shadow_set = None
@@ -61,13 +106,48 @@ class Playlist:
       self._yt_shadow_position_backwards = None
 
    @cached_property
+   @spans.traced
    def yt_playlist(self) -> yt.Playlist:
       if self._yt_playlist is None:
+         ttl = None if config.OFFLINE else config.SNAPSHOT_TTL
+         self._yt_playlist = snapshot.load(self.shadow_file_object.id, ttl=ttl)
+
+      if self._yt_playlist is None:
+         if config.OFFLINE:
+            raise LookupError(f"No snapshot of {u.serialize(self.shadow_file_object.id)} to work offline with!")
          self._yt_playlist = yt.get_playlist(self.shadow_file_object.id)
-      videos_file_object.add(self._yt_playlist.items)
-      write_videos()
+         self._yt_is_live = True
+
+      # Otherwise the items are still coming, and the diff saves them once they're all here.
+      if self._yt_playlist.fetched:
+         self._save_live()
       return self._yt_playlist
 
+   def _save_live(self):
+      """
+      Remembers what YouTube said, if it's what YouTube said during this run.
+      """
+      if self._yt_is_live and not self._saved_live:
+         videos().add(self._yt_playlist.items)
+         write_videos()
+         snapshot.save(self._yt_playlist)
+         self._saved_live = True
+
+   @spans.traced
+   def refetch(self):
+      """
+      Forgets whatever we had from YouTube, snapshots included, and asks again.
+      """
+      if config.OFFLINE:
+         raise ValueError("Cannot fetch from YouTube while offline!")
+
+      self._yt_playlist = yt.get_playlist(self.shadow_file_object.id)
+      self._yt_is_live = True
+      self._saved_live = False
+      self.__dict__.pop("yt_playlist", None)
+      self._should_diff = True
+
+   @spans.traced
    def reset_to_yt(self):
       """
       Ingests any new tracks and resets existing tracks to YouTube's ordering.
@@ -92,44 +172,164 @@ class Playlist:
       self.write()
       self._should_diff = True
 
+   @spans.traced
    def ingest_new_yt(self):
-      while True:
-         missing = sorted(self.missing_from_shadow, key=self.yt_playlist.items.index)
-         if len(missing) == 0:
-            break
-
-         for item in missing:
-            missingno = self.yt_playlist.items.index(item)
-            if missingno == 0:
-               self.shadow_file_object.items.insert(0, textual.PlaylistItem(item))
+      """
+      Puts every track that is on YouTube but not in the shadow right after the
+      track that comes before it on YouTube, or at the head if it's first.
+      Tracks that are already in the shadow are left alone.
+      """
+      # indexof shadow_file_object.items -> new items that go right after it
+      # -1 is the head of the playlist
+      after: dict[int, list[textual.PlaylistItem]] = {}
+
+      # Going in YouTube order means the predecessor of a missing track is
+      # always either in the shadow already or was ingested just before it, so
+      # we never have to fall back to sticking tracks at the end.
+      anchor = -1
+      before: t.Optional[yt.PlaylistItem] = None
+      for item in self.yt_playlist.items:
+         shadow_position = self.yt_shadow_position_forwards.get(item)
+         if shadow_position is not None:
+            anchor = shadow_position
+         else:
+            after.setdefault(anchor, []).append(textual.PlaylistItem(item))
+            if before is None:
                l.info(f"$ <- {item}")
-               break
             else:
-               # let's see if we can find the playlist item before this one
-               before = self.yt_playlist.items[missingno - 1]
-               # and match it with one in the shadow
-               before_position = self.yt_shadow_position_forwards.get(before)
-               if before_position is not None:
-                  self.shadow_file_object.items.insert(before_position + 1, textual.PlaylistItem(item))
-                  l.info(f"{before} <- {item}")
-                  break
-         else:
-            # guess not? let's just grab the first one and put it at the end
-            self.shadow_file_object.items.append(textual.PlaylistItem(missing[0]))
-            l.info(f"{self.shadow_file_object.items[-1]} <- {missing[0]}")
-
+               l.info(f"{before} <- {item}")
+         before = item
+
+      if len(after) > 0:
+         merged = after.get(-1, [])
+         for i, shadow_item in enumerate(self.shadow_file_object.items):
+            merged.append(shadow_item)
+            merged.extend(after.get(i, ()))
+         self.shadow_file_object.items = merged
          self._should_diff = True
+
       self.write()
 
+   @spans.traced
    def write(self):
-      u.overwrite(self.shadow_file, self.shadow_file_object.jsonl())
+      u.overwrite_with(self.shadow_file, self.shadow_file_object.write_jsonl)
+      if playlist_index().update(self.shadow_file_object):
+         write_index()
 
-   def push(self):
-      if not self.diff_ok:
-         raise ValueError("Cannot push to YouTube when the diff is not OK!")
+   def _push_target(self) -> list[t.Union[yt.PlaylistItem, textual.PlaylistItem]]:
+      """
+      What YouTube should have, in the shadow's order. Tracks of the shadow that
+      aren't on YouTube stand for themselves, since they have to be inserted.
+      """
+      target: list[t.Union[yt.PlaylistItem, textual.PlaylistItem]] = []
+      seen: set[str] = set()
+      for item in self.shadow_file_object.items:
+         yt_item = self.yt_lookup.get(item.smol_hash)
+         # A line copied within the shadow is another one of that video.
+         if yt_item is None or item.smol_hash in seen:
+            target.append(item)
+         else:
+            target.append(yt_item)
+            seen.add(item.smol_hash)
+      return target
+
+   @spans.traced
+   def plan_push(self) -> list[plan.Op[t.Union[yt.PlaylistItem, textual.PlaylistItem]]]:
+      return plan.plan_edits(self.yt_playlist.items, self._push_target())
 
-      for ooo in self.ooo:
-         ooo.set_position(self._yt_shadow_position_forwards[ooo])
+   @spans.traced
+   def push(self, confirm: t.Optional[t.Callable[[list[str]], bool]] = None):
+      """
+      Makes YouTube look exactly like the shadow. If that means inserting or
+      deleting anything, confirm is shown what and gets to call it off.
+      """
+      # Never edit YouTube based on what it looked like a while ago.
+      if not self._yt_is_live:
+         self.refetch()
+
+      target = self._push_target()
+      by_id = {item.id: item for item in self.yt_playlist.items}
+      live = list(by_id)
+      # Tracks to insert go by their place in the shadow until YouTube gives them an id.
+      new = {f"+{i}": item for i, item in enumerate(target) if isinstance(item, textual.PlaylistItem)}
+      target_ids = [f"+{i}" if isinstance(item, textual.PlaylistItem) else item.id for i, item in enumerate(target)]
+
+      pending = journal.Journal.load(self.yt_playlist.id)
+      start = None
+      if pending is not None:
+         start = pending.resume_point(live)
+         if start is None or plan.simulate(pending.start, pending.ops) != pending.placeholders(target_ids):
+            # YouTube or the shadow changed since, so the rest of that push
+            # isn't what we want anymore.
+            l.warn(f"Discarding an unfinished push to {self.yt_playlist.title}")
+            pending.finish()
+            pending = None
+         else:
+            l.info(f"Resuming an unfinished push at op {start + 1} of {len(pending.ops)}")
+
+      if pending is None:
+         ops = plan.plan_edits(live, target_ids)
+         if plan.simulate(live, ops) != target_ids:
+            raise ValueError("SANITY: Planned ops do not reproduce the shadow!")
+         if len(ops) == 0:
+            return
+
+         changes = [
+            f"+ {new[op.key].friendly_title} - {new[op.key].friendly_channel_title}" if isinstance(op, plan.Insert) else f"- {by_id[op.key]}"
+            for op in ops
+            if not isinstance(op, plan.Move)
+         ]
+         if confirm is not None and len(changes) > 0 and not confirm(changes):
+            l.info("Not pushing")
+            return
+
+         pending = journal.Journal.begin(self.yt_playlist.id, live, ops)
+         start = 0
+
+      assert start is not None
+      ops = pending.ops[start:]
+      quota.require(plan.cost(ops), f"Pushing {plan.count(ops)}")
+      l.info(f"Pushing {plan.count(ops)} for {plan.cost(ops)} quota units")
+      l.group_start()
+      inserted: list[yt.PlaylistItem] = []
+      try:
+         for i, op in enumerate(ops, start):
+            if isinstance(op, plan.Insert):
+               item = self.yt_playlist.insert(new[op.key].video_id, op.position)
+               pending.mark(i, item.id)
+               by_id[item.id] = item
+               inserted.append(item)
+               l.info(f"+ {item} -> {op.position}")
+            elif isinstance(op, plan.Delete):
+               by_id[op.key].delete()
+               pending.mark(i)
+               l.info(f"- {by_id[op.key]}")
+            else:
+               by_id[op.key].set_position(op.position)
+               pending.mark(i)
+               l.info(f"{by_id[op.key]} -> {op.position}")
+      finally:
+         l.group_end()
+
+      # Now that they have ids, the shadow knows inserted tracks are on YouTube.
+      for placeholder, id_ in pending.created.items():
+         if placeholder in new:
+            new[placeholder].smol_hash = u.smol_hash(id_)
+      if len(pending.created) > 0:
+         self.write()
+      final = pending.result()
+      pending.finish()
+
+      # Anything inserted by a push that died is in by_id since the refetch.
+      self.yt_playlist.items = [by_id[id_] for id_ in final]
+      self.yt_playlist.length = len(final)
+      for position, item in enumerate(self.yt_playlist.items):
+         item.position = position
+      if len(inserted) > 0:
+         videos().add(inserted)
+         write_videos()
+      snapshot.save(self.yt_playlist)
+      self._should_diff = True
 
    def close(self):
       self.shadow_file.close()
@@ -137,9 +337,11 @@ class Playlist:
    def _init_diff(self):
       if not self._should_diff:
          return
+      with spans.span("bridge.Playlist._init_diff"):
+         self._diff()
+
+   def _diff(self):
 
-      self._shadow_set: t.Set[str] = set()
-      self._yt_set: t.Set[str] = set()
       self._shadow_lookup: dict[str, textual.PlaylistItem] = {}
       self._yt_lookup: dict[str, yt.PlaylistItem] = {}
       self._smol_yt_position: dict[str, int] = {}
@@ -154,29 +356,35 @@ class Playlist:
       smol_to_shadow_position: dict[str, int] = {}
       for i, item in enumerate(self.shadow_file_object.items):
          smol_to_shadow_position[item.smol_hash] = i
-         self._shadow_set.add(item.smol_hash)
          self._shadow_lookup[item.smol_hash] = item
 
 
-      for i, item in enumerate(self.yt_playlist.items):
+      # Items are looked at as they arrive, while the rest are still being fetched.
+      for i, item in enumerate(self.yt_playlist.iter_items()):
          smol = u.smol_hash(item.id)
-         self._smol_yt_position[smol] = i
          shadow_position = smol_to_shadow_position.get(smol)
          if shadow_position is not None:
+            # The same smol as the shadow's, so only one of them stays around.
+            smol = self.shadow_file_object.items[shadow_position].smol_hash
             self._yt_shadow_position_forwards[item] = shadow_position
             self._yt_shadow_position_backwards[shadow_position] = item
-         self._yt_set.add(smol)
+         self._smol_yt_position[smol] = i
          self._yt_lookup[smol] = item
 
+      # Views rather than sets of their own, since the lookups already have every smol.
+      self._shadow_set = self._shadow_lookup.keys()
+      self._yt_set = self._yt_lookup.keys()
+
+      self._save_live()
       self._should_diff = False
 
    @property
-   def shadow_set(self) -> t.Set[str]:
+   def shadow_set(self) -> t.AbstractSet[str]:
       self._init_diff()
       return self._shadow_set
 
    @property
-   def yt_set(self) -> t.Set[str]:
+   def yt_set(self) -> t.AbstractSet[str]:
       self._init_diff()
       return self._yt_set
 
@@ -218,6 +426,7 @@ class Playlist:
       return len(self.missing_from_yt) == 0 and len(self.missing_from_shadow) == 0
 
    @property
+   @spans.traced
    def ooo(self) -> list[yt.PlaylistItem]:
       if not self.diff_ok:
          raise ValueError("Cannot get out-of-order elements if the diff is not OK!")
@@ -228,17 +437,66 @@ class Playlist:
 
       return [self.yt_shadow_position_backwards[pos] for pos in out_of_order_positions]
 
+def _reuse_snapshot(p: yt.Playlist) -> bool:
+   """
+   Returns whether fetching the items can be skipped because nothing changed.
+   """
+   unchanged = snapshot.unchanged_items(p)
+   if unchanged is not None:
+      p.items = unchanged
+      return True
+   return False
+
+def iter_playlists_online() -> t.Iterator[Playlist]:
+   """
+   Yields playlists in the order that YouTube lists them while their items,
+   and those of the following ones, are still being fetched in the background.
+   """
+   yt_playlists = yt.my_playlists()
+   with ThreadPoolExecutor(max_workers=config.FETCH_WORKERS) as pool:
+      unchanged = set(p.id for p, skipped in zip(yt_playlists, pool.map(_reuse_snapshot, yt_playlists)) if skipped)
+      l.info(f"{len(unchanged)} of {len(yt_playlists)} playlists are unchanged since they were last fetched")
+
+      changed, deferred = quota.schedule(
+         [p for p in yt_playlists if p.id not in unchanged],
+         cost=lambda p: p.fetch_cost,
+         last_done=lambda p: snapshot.synced_at(p.id),
+      )
+      l.info(f"Fetching {len(changed)} playlists costs {sum(p.fetch_cost for p in changed)} of the {quota.remaining()} quota units left today")
+      if len(deferred) > 0:
+         l.warn(f"Leaving {len(deferred)} playlists for tomorrow:")
+         l.group_start()
+         for p in deferred:
+            l.warn(p.title)
+         l.group_end()
+
+      deferred_ids = set(p.id for p in deferred)
+      scheduled = [p for p in yt_playlists if p.id not in deferred_ids]
+      fetches = [pool.submit(p.fetch_items) for p in scheduled]
+      try:
+         for p, fetch in zip(scheduled, fetches):
+            yield Playlist(yt_playlist=p, from_snapshot=p.id in unchanged)
+            fetch.result()
+      finally:
+         # Whoever stopped early doesn't want the rest, so don't spend quota on it.
+         pool.shutdown(cancel_futures=True)
+
 def my_playlists_online() -> list[Playlist]:
-   return [Playlist(yt_playlist=p) for p in yt.my_playlists()]
+   return list(iter_playlists_online())
 
 def my_playlist_files() -> list[str]:
-   return [filename[:-6] for filename in os.listdir(config.PLAYLISTS_PATH) if filename.endswith(".jsonl")]
+   return [
+      filename[:-6]
+      for filename in os.listdir(config.PLAYLISTS_PATH)
+      # .videos.jsonl and .index.jsonl aren't playlists
+      if filename.endswith(".jsonl") and not filename.startswith(".")
+   ]
 
 def get_playlist_offline(filename: str) -> Playlist:
    return Playlist(playlist_filepath=f"{config.PLAYLISTS_PATH}/{filename}.jsonl")
 
 def my_playlists_offline() -> list[Playlist]:
    return [
-      Playlist(playlist_filepath=f"{config.PLAYLISTS_PATH}/{filename}")
+      get_playlist_offline(filename)
       for filename in my_playlist_files()
    ]
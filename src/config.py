@@ -1,5 +1,36 @@
+import typing as t
+
 PORT = 0
 SCOPES = ["https://www.googleapis.com/auth/youtube.force-ssl"]
 TOKEN_PATH = "secrets/token.json"
 PLAYLISTS_PATH = "../yu-playlists"
+# Least severe logs that are shown, 0 debug, 1 info, 2 warn and 3 error
 LOG_LEVEL = 1
+# How many playlists have their items fetched at once during full runs
+FETCH_WORKERS = 8
+# .videos.jsonl is rewritten from scratch once this much of it is stale
+VIDEOS_GARBAGE_RATIO = 0.5
+# Same for .index.jsonl
+INDEX_GARBAGE_RATIO = 0.5
+# Analysis reuses what YouTube said about a playlist for this many seconds
+SNAPSHOT_TTL = 15 * 60
+# Never talk to YouTube and use snapshots no matter how old they are
+OFFLINE = False
+# Responses kept around for If-None-Match, least recently used go first
+HTTP_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# What the YouTube Data API gives us per day, in units
+QUOTA_PER_DAY = 10_000
+# Talk to this instead of YouTube, without logging in, e.g. fakeyt's "http://127.0.0.1:8080/"
+API_ENDPOINT: t.Optional[str] = None
+# Write a Chrome trace of every run here, e.g. "trace.json"
+TRACE_PATH: t.Optional[str] = None
+# Also log here as JSON lines, one per message, e.g. "log.jsonl"
+LOG_JSON_PATH: t.Optional[str] = None
+# Seconds logs can sit in memory before they're written out
+LOG_FLUSH_INTERVAL = 0.1
+# Ask YouTube for only the fields that are read rather than everything
+PARTIAL_RESPONSES = True
+# Most connections to YouTube open at once, shared by every thread
+HTTP_POOL_SIZE = 8
+# Connections unused for this many seconds are closed rather than reused
+HTTP_KEEP_ALIVE = 60
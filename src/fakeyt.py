@@ -0,0 +1,477 @@
+# A YouTube Data API that lives on localhost, for load-testing full runs and
+# pushes without spending real quota. Point yt at it with config.API_ENDPOINT.
+#
+# Implements playlists.list, playlistItems.list/insert/update/delete and
+# videos.list the way YouTube does: pages of at most 50, positions that shift
+# around as items are inserted, moved and deleted, ETags that answer
+# If-None-Match with a 304, and quota charged per call. It can also be told to be
+# slow or to fail.
+#
+# uv run src/fakeyt.py --port 8080 --playlists 20 --items 500 --latency 0.05
+from __future__ import annotations
+import gzip
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import typing as t
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import quota
+import config
+
+ERRORS: dict[t.Union[int, str], tuple[int, str, str]] = {
+   429: (429, "rateLimitExceeded", "Too many requests."),
+   500: (500, "backendError", "Backend Error"),
+   503: (503, "backendError", "The service is currently unavailable."),
+   "quotaExceeded": (403, "quotaExceeded", "The request cannot be completed because you have exceeded your quota."),
+}
+"""
+What can be injected, and how YouTube says it.
+"""
+
+def _thumbnails(id_: str) -> dict[str, t.Any]:
+   """
+   What YouTube sends along with every playlist and item, whether it's used or not.
+   """
+   sizes = {"default": (120, 90), "medium": (320, 180), "high": (480, 360), "standard": (640, 480), "maxres": (1280, 720)}
+   return {
+      size: {"url": f"https://i.ytimg.com/vi/{id_}/{size}.jpg", "width": width, "height": height}
+      for size, (width, height) in sizes.items()
+   }
+
+class ApiError(Exception):
+   def __init__(self, status: int, reason: str, message: str):
+      super().__init__(message)
+      self.status = status
+      self.reason = reason
+      self.message = message
+
+def _etag(x: t.Any) -> str:
+   return hashlib.sha256(json.dumps(x, sort_keys=True).encode()).hexdigest()[:27]
+
+class FakeYouTube:
+   def __init__(self, *,
+                latency: float = 0.0,
+                jitter: float = 0.0,
+                error_rates: t.Optional[dict[t.Union[int, str], float]] = None,
+                quota_per_day: int = config.QUOTA_PER_DAY,
+                shuffle: float = 0.0,
+                seed: int = 0,
+               ):
+      self.latency = latency
+      """
+      Seconds every request takes before it's answered, give or take jitter.
+      """
+      self.jitter = jitter
+      self.error_rates = error_rates or {}
+      """
+      Chance that any request fails, per key of ERRORS.
+      """
+      self.quota_per_day = quota_per_day
+      self.shuffle = shuffle
+      """
+      How many places away from where it belongs playlistItems.list may send an
+      item, pages included. YouTube doesn't always send them in order either.
+      """
+      self.quota_used = 0
+      self.requests: dict[str, int] = {}
+      """
+      method id -> how many times it was called, failures included
+      """
+
+      self._rng = random.Random(seed)
+      self._lock = threading.RLock()
+      self._failures: list[t.Union[int, str]] = []
+      self._next_id = 0
+      self._playlists: dict[str, dict[str, t.Any]] = {}
+      self._items: dict[str, list[dict[str, t.Any]]] = {}
+      """
+      playlist id -> items, in order. position is filled in on the way out.
+      """
+      self._videos: dict[str, dict[str, t.Any]] = {}
+      self._server: t.Optional[ThreadingHTTPServer] = None
+
+   # Setting things up
+
+   def _id(self, prefix: str) -> str:
+      self._next_id += 1
+      return prefix + hashlib.sha256(f"{prefix}{self._next_id}".encode()).hexdigest()[:32]
+
+   def add_video(self, title: str, channel_title: t.Optional[str] = "Some Channel", video_id: t.Optional[str] = None) -> str:
+      """
+      channel_title None is what a private or deleted video looks like.
+      """
+      with self._lock:
+         video_id = video_id or self._id("")[:11]
+         self._videos[video_id] = {"title": title, "channelTitle": channel_title}
+         return video_id
+
+   def add_playlist(self, title: str, video_ids: t.Sequence[str] = ()) -> str:
+      with self._lock:
+         playlist_id = self._id("PL")
+         self._playlists[playlist_id] = {
+            "id": playlist_id,
+            "snippet": {
+               "publishedAt": "2025-01-01T00:00:00Z",
+               "channelId": "UCfake",
+               "title": title,
+               "description": f"All of my {title} in one place.",
+               "thumbnails": _thumbnails(playlist_id),
+               "channelTitle": "me",
+            },
+         }
+         self._items[playlist_id] = []
+         for video_id in video_ids:
+            self._insert(playlist_id, video_id, None)
+         return playlist_id
+
+   def video_ids(self, playlist_id: str) -> list[str]:
+      with self._lock:
+         return [item["snippet"]["resourceId"]["videoId"] for item in self._items[playlist_id]]
+
+   def fail_next(self, kind: t.Union[int, str], times: int = 1):
+      """
+      Makes the next requests fail, whatever error_rates says.
+      """
+      with self._lock:
+         self._failures.extend([kind] * times)
+
+   # Serving
+
+   def start(self, port: int = 0) -> str:
+      """
+      Returns what config.API_ENDPOINT should be.
+      """
+      fake = self
+
+      class Handler(_Handler):
+         youtube = fake
+
+      self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+      self._server.daemon_threads = True
+      threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+      return f"http://127.0.0.1:{self._server.server_address[1]}/"
+
+   def stop(self):
+      if self._server is not None:
+         self._server.shutdown()
+         self._server.server_close()
+         self._server = None
+
+   def __enter__(self) -> FakeYouTube:
+      return self
+
+   def __exit__(self, *_):
+      self.stop()
+
+   def handle(self, method: str, resource: str, query: dict[str, str], body: t.Any) -> t.Any:
+      """
+      What a request to youtube/v3/<resource> answers, or ApiError.
+      """
+      kind = {"GET": "list", "POST": "insert", "PUT": "update", "DELETE": "delete"}.get(method)
+      handler = getattr(self, f"_{resource}_{kind}", None)
+      if handler is None:
+         raise ApiError(404, "notFound", f"{method} {resource} is not a thing.")
+      method_id = f"youtube.{resource}.{kind}"
+
+      with self._lock:
+         self.requests[method_id] = self.requests.get(method_id, 0) + 1
+         failure = self._failures.pop(0) if len(self._failures) > 0 else None
+         if failure is None:
+            for error, rate in self.error_rates.items():
+               if self._rng.random() < rate:
+                  failure = error
+                  break
+         if failure is None and self.quota_used + quota.cost_of(method_id) > self.quota_per_day:
+            failure = "quotaExceeded"
+         if failure is not None:
+            raise ApiError(*ERRORS[failure])
+         self.quota_used += quota.cost_of(method_id)
+         return handler(query, body)
+
+   # playlists
+
+   def _playlist_resource(self, playlist_id: str) -> dict[str, t.Any]:
+      resource = {"kind": "youtube#playlist", **self._playlists[playlist_id], "contentDetails": {"itemCount": len(self._items[playlist_id])}}
+      # Only what's in the resource, item count included. YouTube doesn't say
+      # that a playlist's etag changes when its items are just moved around, so
+      # neither does this one.
+      resource["etag"] = _etag(resource)
+      return resource
+
+   def _playlists_list(self, query: dict[str, str], _: t.Any) -> t.Any:
+      if "id" in query:
+         ids = [id_ for id_ in query["id"].split(",") if id_ in self._playlists]
+      elif query.get("mine") == "true":
+         ids = list(self._playlists)
+      else:
+         raise ApiError(400, "missingRequiredParameter", "No filter selected.")
+      return _page("youtube#playlistListResponse", [self._playlist_resource(id_) for id_ in ids], query)
+
+   # playlistItems
+
+   def _item_resource(self, playlist_id: str, position: int) -> dict[str, t.Any]:
+      item = self._items[playlist_id][position]
+      video = self._videos.get(item["snippet"]["resourceId"]["videoId"], {"title": "Deleted video", "channelTitle": None})
+      snippet = {
+         **item["snippet"],
+         "position": position,
+         "title": video["title"],
+         "description": f"{video['title']} by {video['channelTitle']}. Official audio, lyrics in the comments.",
+         "thumbnails": _thumbnails(item["snippet"]["resourceId"]["videoId"]),
+         "channelId": "UCfake",
+         "channelTitle": "me",
+      }
+      if video["channelTitle"] is not None:
+         snippet["videoOwnerChannelTitle"] = video["channelTitle"]
+         snippet["videoOwnerChannelId"] = "UC" + _etag(video["channelTitle"])[:22]
+      resource = {"kind": "youtube#playlistItem", "id": item["id"], "snippet": snippet}
+      resource["etag"] = _etag(resource)
+      return resource
+
+   def _items_of(self, playlist_id: t.Optional[str]) -> list[dict[str, t.Any]]:
+      if playlist_id not in self._items:
+         raise ApiError(404, "playlistNotFound", "The playlist identified with the request's playlistId parameter cannot be found.")
+      return self._items[playlist_id]
+
+   def _find(self, item_id: str) -> tuple[str, int]:
+      for playlist_id, items in self._items.items():
+         for position, item in enumerate(items):
+            if item["id"] == item_id:
+               return playlist_id, position
+      raise ApiError(404, "playlistItemNotFound", "Playlist item not found.")
+
+   def _insert(self, playlist_id: str, video_id: str, position: t.Optional[int]) -> int:
+      items = self._items_of(playlist_id)
+      if position is None:
+         position = len(items)
+      if not 0 <= position <= len(items):
+         raise ApiError(400, "invalidPlaylistItemPosition", "Playlist item position is invalid.")
+      items.insert(position, {
+         "id": self._id("UEx"),
+         "snippet": {"playlistId": playlist_id, "resourceId": {"kind": "youtube#video", "videoId": video_id}},
+      })
+      return position
+
+   def _playlistItems_list(self, query: dict[str, str], _: t.Any) -> t.Any:
+      items = self._items_of(query.get("playlistId"))
+      order = list(range(len(items)))
+      if self.shuffle > 0:
+         # The same every time, so that pages don't contradict each other.
+         rng = random.Random(f"{query['playlistId']}{len(items)}")
+         order.sort(key=lambda i: i + rng.random() * self.shuffle)
+      return _page("youtube#playlistItemListResponse", [self._item_resource(query["playlistId"], i) for i in order], query)
+
+   def _playlistItems_insert(self, _: dict[str, str], body: t.Any) -> t.Any:
+      snippet = body["snippet"]
+      video_id = snippet["resourceId"]["videoId"]
+      if video_id not in self._videos:
+         raise ApiError(404, "videoNotFound", "Video not found.")
+      position = self._insert(snippet["playlistId"], video_id, snippet.get("position"))
+      return self._item_resource(snippet["playlistId"], position)
+
+   def _playlistItems_update(self, _: dict[str, str], body: t.Any) -> t.Any:
+      playlist_id, old = self._find(body["id"])
+      items = self._items[playlist_id]
+      position = body["snippet"].get("position", old)
+      if not 0 <= position < len(items):
+         raise ApiError(400, "invalidPlaylistItemPosition", "Playlist item position is invalid.")
+      items.insert(position, items.pop(old))
+      return self._item_resource(playlist_id, position)
+
+   def _playlistItems_delete(self, query: dict[str, str], _: t.Any) -> t.Any:
+      playlist_id, position = self._find(query.get("id", ""))
+      del self._items[playlist_id][position]
+      return None
+
+   # videos
+
+   def _videos_list(self, query: dict[str, str], _: t.Any) -> t.Any:
+      resources = []
+      for video_id in query.get("id", "").split(","):
+         video = self._videos.get(video_id)
+         if video is None or video["channelTitle"] is None:
+            continue
+         resource = {"kind": "youtube#video", "id": video_id, "snippet": {"title": video["title"], "channelTitle": video["channelTitle"]}}
+         resource["etag"] = _etag(resource)
+         resources.append(resource)
+      return _page("youtube#videoListResponse", resources, query)
+
+def _parse_fields(fields: str, i: int = 0) -> tuple[dict[str, t.Any], int]:
+   """
+   A fields mask like "items(id,snippet/title)" as a tree of dicts, where None
+   means all of it. Also returns where it stopped, for the recursion.
+   """
+   tree: dict[str, t.Any] = {}
+   path = ""
+
+   def add(path: str, sub: t.Any):
+      node = tree
+      *parents, last = path.strip().split("/")
+      for part in parents:
+         if node.get(part, {}) is None:
+            # Already all of it.
+            return
+         node = node.setdefault(part, {})
+      node[last] = sub
+
+   while i < len(fields):
+      char = fields[i]
+      if char == "(":
+         sub, i = _parse_fields(fields, i + 1)
+         add(path, sub)
+         path = ""
+      elif char == ")":
+         break
+      elif char == ",":
+         if path != "":
+            add(path, None)
+         path = ""
+      else:
+         path += char
+      i += 1
+   if path != "":
+      add(path, None)
+   return tree, i
+
+def _select(x: t.Any, tree: t.Optional[dict[str, t.Any]]) -> t.Any:
+   """
+   The parts of x that tree asks for, the way a partial response has them.
+   """
+   if tree is None:
+      return x
+   if isinstance(x, list):
+      return [_select(y, tree) for y in x]
+   if isinstance(x, dict):
+      return {key: _select(x[key], sub) for key, sub in tree.items() if key in x}
+   return x
+
+def _page(kind: str, resources: list[t.Any], query: dict[str, str]) -> t.Any:
+   """
+   The page of resources that query asks for. Page tokens are just offsets, but
+   nobody is supposed to know that.
+   """
+   per_page = min(int(query.get("maxResults", 5)), 50)
+   token = query.get("pageToken")
+   start = int(token[1:]) if token else 0
+   page = {
+      "kind": kind,
+      "pageInfo": {"totalResults": len(resources), "resultsPerPage": per_page},
+      "items": resources[start:start + per_page],
+   }
+   if start + per_page < len(resources):
+      page["nextPageToken"] = f"P{start + per_page}"
+   if start > 0:
+      page["prevPageToken"] = f"P{max(0, start - per_page)}"
+   page["etag"] = _etag(page)
+   return page
+
+class _Handler(BaseHTTPRequestHandler):
+   youtube: FakeYouTube
+   protocol_version = "HTTP/1.1"
+   # Headers and body go out separately, which Nagle turns into 40 ms per
+   # response on a kept-alive connection.
+   disable_nagle_algorithm = True
+
+   def log_message(self, format: str, *args: t.Any):
+      pass
+
+   def _send(self, status: int, body: t.Any, etag: t.Optional[str] = None):
+      data = b"" if body is None else json.dumps(body).encode()
+      self.send_response(status)
+      if body is not None:
+         self.send_header("Content-Type", "application/json; charset=UTF-8")
+         if "gzip" in self.headers.get("Accept-Encoding", ""):
+            data = gzip.compress(data)
+            self.send_header("Content-Encoding", "gzip")
+      if etag is not None:
+         self.send_header("ETag", f'"{etag}"')
+      self.send_header("Content-Length", str(len(data)))
+      self.end_headers()
+      self.wfile.write(data)
+
+   def _serve(self):
+      url = urllib.parse.urlsplit(self.path)
+      query = dict(urllib.parse.parse_qsl(url.query))
+      length = int(self.headers.get("Content-Length") or 0)
+      body = json.loads(self.rfile.read(length)) if length > 0 else None
+
+      fake = self.youtube
+      delay = fake.latency + fake.jitter * (2 * random.random() - 1)
+      if delay > 0:
+         time.sleep(delay)
+
+      if not url.path.startswith("/youtube/v3/"):
+         self._send(404, {"error": {"code": 404, "message": "Not Found", "errors": []}})
+         return
+      try:
+         result = fake.handle(self.command, url.path[len("/youtube/v3/"):], query, body)
+      except ApiError as e:
+         self._send(e.status, {"error": {
+            "code": e.status,
+            "message": e.message,
+            "errors": [{"message": e.message, "domain": "youtube.quota" if e.reason == "quotaExceeded" else "youtube", "reason": e.reason}],
+         }})
+         return
+
+      if result is None:
+         self._send(204, None)
+         return
+      etag = result.get("etag")
+      if "fields" in query:
+         result = _select(result, _parse_fields(query["fields"])[0])
+      if self.command == "GET" and etag is not None and self.headers.get("If-None-Match") in (etag, f'"{etag}"'):
+         self._send(304, None, etag)
+         return
+      self._send(200, result, etag)
+
+   do_GET = do_POST = do_PUT = do_DELETE = _serve
+
+def _seeded(playlists: int, items: int, seed: int, **kwargs: t.Any) -> FakeYouTube:
+   fake = FakeYouTube(seed=seed, **kwargs)
+   rng = random.Random(seed)
+   words = ["Night", "Sky", "夜", "空", "사랑", "Dance", "Rain", "星", "Blue", "Fire", "꿈", "Moon", "Café", "Ñandú"]
+   channels = [" ".join(rng.choices(words, k=2)) for _ in range(50)]
+   for i in range(playlists):
+      video_ids = [
+         fake.add_video(" ".join(rng.choices(words, k=rng.randint(1, 6))), rng.choice(channels) if rng.random() > 0.01 else None)
+         for _ in range(items)
+      ]
+      fake.add_playlist(f"Playlist {i}", video_ids)
+   return fake
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser(description="Serve a made-up YouTube Data API.")
+   parser.add_argument("--port", type=int, default=8080)
+   parser.add_argument("--playlists", type=int, default=10)
+   parser.add_argument("--items", type=int, default=200)
+   parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+   parser.add_argument("--jitter", type=float, default=0.0)
+   parser.add_argument("--error-rate", type=float, default=0.0, help="chance of a 429, 500 or 503, each")
+   parser.add_argument("--quota-error-rate", type=float, default=0.0)
+   parser.add_argument("--quota", type=int, default=config.QUOTA_PER_DAY)
+   parser.add_argument("--shuffle", type=float, default=0.0, help="how far out of order items may come")
+   parser.add_argument("--seed", type=int, default=0)
+   args = parser.parse_args()
+
+   fake = _seeded(
+      args.playlists, args.items, args.seed,
+      latency=args.latency,
+      jitter=args.jitter,
+      error_rates={429: args.error_rate, 500: args.error_rate, 503: args.error_rate, "quotaExceeded": args.quota_error_rate},
+      quota_per_day=args.quota,
+      shuffle=args.shuffle,
+   )
+   endpoint = fake.start(args.port)
+   print(f"Serving {args.playlists} playlists of {args.items} items at {endpoint}")
+   print(f'Set config.API_ENDPOINT = "{endpoint}" to use it.')
+   try:
+      while True:
+         time.sleep(60)
+         print(f"{fake.quota_used} quota units used, {fake.requests}")
+   except KeyboardInterrupt:
+      fake.stop()
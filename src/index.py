@@ -0,0 +1,135 @@
+# Which playlists every track is in, across the whole library.
+# Like .videos.jsonl, .index.jsonl is an append-only log, one record per
+# playlist, where the last record for a playlist wins.
+from __future__ import annotations
+import typing as t
+import util as u
+import textual
+
+Location = tuple[str, int]
+"""
+(playlist id, position)
+"""
+
+class Index:
+   def __init__(self, source: str = ""):
+      self._titles: dict[str, str] = {}
+      self._playlists: dict[str, tuple[list[str], list[str]]] = {}
+      """
+      playlist id -> ([video_id], [smol_hash]), in shadow order
+      """
+      self._by_video: dict[str, dict[str, list[int]]] = {}
+      """
+      video_id -> playlist id -> positions
+      """
+      self._by_smol: dict[str, dict[str, list[int]]] = {}
+      """
+      smol_hash -> playlist id -> positions
+      """
+      self._duplicates: set[str] = set()
+      """
+      video_ids that show up more than once, in one playlist or across several.
+      """
+      self._pending: set[str] = set()
+      self.records = 0
+
+      for line in source.splitlines():
+         if line.strip() == "":
+            continue
+         id_, title, video_ids, smol_hashes = u.deserialize(line)
+         self._set(id_, title, video_ids, smol_hashes)
+         self.records += 1
+
+   def _set(self, id_: str, title: str, video_ids: list[str], smol_hashes: list[str]):
+      touched: set[str] = set()
+
+      old = self._playlists.pop(id_, None)
+      if old is not None:
+         for video_id in old[0]:
+            self._by_video[video_id].pop(id_, None)
+            touched.add(video_id)
+         for smol in old[1]:
+            playlists = self._by_smol.get(smol)
+            if playlists is not None:
+               playlists.pop(id_, None)
+               if len(playlists) == 0:
+                  del self._by_smol[smol]
+
+      self._titles[id_] = title
+      self._playlists[id_] = (video_ids, smol_hashes)
+      for position, (video_id, smol) in enumerate(zip(video_ids, smol_hashes)):
+         self._by_video.setdefault(video_id, {}).setdefault(id_, []).append(position)
+         self._by_smol.setdefault(smol, {}).setdefault(id_, []).append(position)
+         touched.add(video_id)
+
+      for video_id in touched:
+         playlists = self._by_video[video_id]
+         if sum(map(len, playlists.values())) > 1:
+            self._duplicates.add(video_id)
+         else:
+            self._duplicates.discard(video_id)
+            if len(playlists) == 0:
+               del self._by_video[video_id]
+
+   def update(self, playlist: textual.Playlist) -> bool:
+      """
+      Returns whether anything changed.
+      """
+      video_ids = [item.video_id for item in playlist.items]
+      smol_hashes = [item.smol_hash for item in playlist.items]
+      if self._titles.get(playlist.id) == playlist.title and self._playlists.get(playlist.id) == (video_ids, smol_hashes):
+         return False
+
+      self._set(playlist.id, playlist.title, video_ids, smol_hashes)
+      self._pending.add(playlist.id)
+      return True
+
+   def title(self, playlist_id: str) -> str:
+      return self._titles[playlist_id]
+
+   def containing(self, video_id: str) -> list[Location]:
+      return _locations(self._by_video.get(video_id, {}))
+
+   def locate(self, smol_hash: str) -> list[Location]:
+      return _locations(self._by_smol.get(smol_hash, {}))
+
+   def duplicates(self) -> dict[str, list[Location]]:
+      return {video_id: self.containing(video_id) for video_id in self._duplicates}
+
+   def __len__(self) -> int:
+      return len(self._playlists)
+
+   @property
+   def garbage_ratio(self) -> float:
+      """
+      How much of the log would be stale once the pending playlists are appended.
+      """
+      records = self.records + len(self._pending)
+      if records == 0:
+         return 0.0
+      return (records - len(self._playlists)) / records
+
+   def _record(self, id_: str) -> str:
+      video_ids, smol_hashes = self._playlists[id_]
+      return u.serialize([id_, self._titles[id_], video_ids, smol_hashes]) + "\n"
+
+   def pending_jsonl(self) -> str:
+      """
+      The records to append to the log. They count as written afterwards.
+      """
+      out = "".join(map(self._record, self._pending))
+      self.records += len(self._pending)
+      self._pending.clear()
+      return out
+
+   def compact_jsonl(self) -> str:
+      """
+      The whole log with one record per playlist. It counts as written afterwards.
+      """
+      out = "".join(map(self._record, self._playlists))
+      self.records = len(self._playlists)
+      self._pending.clear()
+      return out
+
+def _locations(playlists: dict[str, list[int]]) -> list[Location]:
+   return [(id_, position) for id_, positions in playlists.items() for position in positions]
@@ -0,0 +1,146 @@
+# Write-ahead journal for pushes, so that a push that dies halfway (crash,
+# Ctrl-C, quota) picks up where it left off instead of paying for every op
+# again.
+#
+# .push/<playlist id>.jsonl holds the plan on the first line, then the index of
+# every op that YouTube has confirmed, one per line. Inserts are marked along
+# with the id YouTube gave the new item.
+from __future__ import annotations
+import os
+import typing as t
+import util as u
+import plan
+import config
+
+def _path(playlist_id: str) -> str:
+   return f"{config.PLAYLISTS_PATH}/.push/{playlist_id}.jsonl"
+
+def _dump_op(op: plan.Op[str]) -> list[t.Any]:
+   if isinstance(op, plan.Insert):
+      return ["insert", op.key, op.position]
+   if isinstance(op, plan.Delete):
+      return ["delete", op.key]
+   return ["move", op.key, op.position]
+
+def _load_op(dumped: list[t.Any]) -> plan.Op[str]:
+   kind, *args = dumped
+   if kind == "insert":
+      return plan.Insert(*args)
+   if kind == "delete":
+      return plan.Delete(*args)
+   if kind == "move":
+      return plan.Move(*args)
+   raise ValueError(f"Unknown op {u.serialize(kind)} in push journal!")
+
+class Journal:
+   def __init__(self, playlist_id: str, start: list[str], ops: list[plan.Op[str]], done: int = 0, created: t.Optional[dict[str, str]] = None):
+      self.playlist_id = playlist_id
+      self.start = start
+      """
+      Playlist item ids in the order YouTube had them when the push was planned.
+      """
+      self.ops = ops
+      """
+      Inserts are keyed by a placeholder, since the item doesn't have an id yet.
+      """
+      self.done = done
+      """
+      How many ops at the front of ops are known to have gone through.
+      """
+      self.created = created if created is not None else {}
+      """
+      placeholder -> id YouTube gave the inserted item
+      """
+
+   @staticmethod
+   def begin(playlist_id: str, start: list[str], ops: list[plan.Op[str]]) -> Journal:
+      header = u.serialize({"start": start, "ops": list(map(_dump_op, ops))})
+      u.atomic_write(_path(playlist_id), header + "\n")
+      return Journal(playlist_id, start, ops)
+
+   @staticmethod
+   def load(playlist_id: str) -> t.Optional[Journal]:
+      try:
+         with open(_path(playlist_id), encoding="utf-8") as f:
+            lines = f.read().splitlines()
+      except FileNotFoundError:
+         return None
+
+      header = u.deserialize(lines[0])
+      ops = list(map(_load_op, header["ops"]))
+      journal = Journal(playlist_id, header["start"], ops)
+      for line in lines[1:]:
+         try:
+            mark = u.deserialize(line)
+         except u.JSONDecodeError:
+            # Torn write of the last mark.
+            break
+         if isinstance(mark, list):
+            i, created = mark
+            journal.created[ops[i].key] = created
+         else:
+            i = mark
+         journal.done = max(journal.done, i + 1)
+      return journal
+
+   def _real(self, ops: list[plan.Op[str]]) -> list[plan.Op[str]]:
+      """
+      ops with the placeholders of inserts that went through swapped for their ids.
+      """
+      return [
+         plan.Insert(self.created[op.key], op.position) if isinstance(op, plan.Insert) and op.key in self.created else op
+         for op in ops
+      ]
+
+   def resume_point(self, live: list[str]) -> t.Optional[int]:
+      """
+      Which op to carry on from, given the order YouTube has now. The op after
+      the last marked one might have gone through without being marked, in
+      which case it's marked now. None if YouTube doesn't look like any point of
+      this push.
+      """
+      after_done = plan.simulate(self.start, self._real(self.ops[:self.done]))
+      if self.done < len(self.ops):
+         op = self.ops[self.done]
+         if isinstance(op, plan.Insert):
+            # Whatever YouTube has at op.position that we've never seen is it.
+            if len(live) == len(after_done) + 1 and op.position < len(live) and live[:op.position] + live[op.position + 1:] == after_done and live[op.position] not in self.start:
+               self.mark(self.done, live[op.position])
+               return self.done
+         elif plan.simulate(after_done, [op]) == live:
+            self.mark(self.done)
+            return self.done
+      if after_done == live:
+         return self.done
+      return None
+
+   def result(self) -> list[str]:
+      """
+      The order YouTube ends up with once every op has gone through.
+      """
+      return plan.simulate(self.start, self._real(self.ops))
+
+   def placeholders(self, ids: list[str]) -> list[str]:
+      """
+      ids with the ones of items this push inserted swapped back for their placeholders.
+      """
+      placeholder_of = {id_: placeholder for placeholder, id_ in self.created.items()}
+      return [placeholder_of.get(id_, id_) for id_ in ids]
+
+   def mark(self, i: int, created: t.Optional[str] = None):
+      """
+      Records that ops[i] went through. created is the id of the item, for inserts.
+      """
+      with open(_path(self.playlist_id), "a", encoding="utf-8") as f:
+         f.write(u.serialize(i if created is None else [i, created]) + "\n")
+         f.flush()
+         os.fsync(f.fileno())
+      if created is not None:
+         self.created[self.ops[i].key] = created
+      self.done = i + 1
+
+   def finish(self):
+      try:
+         os.remove(_path(self.playlist_id))
+      except FileNotFoundError:
+         pass
@@ -1,18 +1,37 @@
 import sys
+import json
+import time
+import atexit
+import threading
+import typing as t
 import config
-import pprint
+import spans
 import colorama as c
 
-_indent_level: int = 0
+DEBUG = 0
+INFO = 1
+WARN = 2
+ERROR = 3
+
+_groups = threading.local()
+"""
+Per thread: how deep in groups it is (indent), and the span of every group it's
+in, or None for groups without a name (stack).
+"""
+
+def _indent_level() -> int:
+   return getattr(_groups, "indent", 0)
 
 def _get_indent() -> str:
-   return " | " * _indent_level
+   return " | " * _indent_level()
 
 def _pretty_prefix(v, prefix: str) -> str:
    msg: str
    if isinstance(v, str):
       msg = v
    else:
+      import pprint
+
       msg = pprint.pformat(v)
    return "".join([""
       + prefix + c.Style.RESET_ALL + _get_indent() + " "
@@ -20,26 +39,142 @@ def _pretty_prefix(v, prefix: str) -> str:
       for line in msg.split("\n")
    ])
 
-def group_start():
-   global _indent_level
-   _indent_level += 1
+class _Sink:
+   """
+   Collects what is written to it and passes it on in batches: once there's
+   enough of it, every config.LOG_FLUSH_INTERVAL seconds from a background
+   thread, and on flush() and close().
+   """
+
+   def __init__(self, write: t.Callable[[str], t.Any], flush: t.Callable[[], t.Any]):
+      self._write = write
+      self._flush = flush
+      self._lock = threading.Lock()
+      self._pending: list[str] = []
+      self._size = 0
+      self._flusher: t.Optional[threading.Thread] = None
+      self._closed = threading.Event()
+
+   def write(self, text: str):
+      with self._lock:
+         self._pending.append(text)
+         self._size += len(text)
+         full = self._size >= 64 * 1024
+         if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_every, name="log", daemon=True)
+            self._flusher.start()
+      if full:
+         self.flush()
+
+   def flush(self):
+      with self._lock:
+         if len(self._pending) == 0:
+            return
+         text = "".join(self._pending)
+         self._pending.clear()
+         self._size = 0
+         # Under the lock, so that batches don't overtake each other.
+         self._write(text)
+         self._flush()
+
+   def close(self):
+      """
+      Flushes and stops the background thread. Whatever is written after this
+      only goes anywhere on flush().
+      """
+      self._closed.set()
+      if self._flusher is not None:
+         self._flusher.join()
+      self.flush()
+
+   def _flush_every(self):
+      while not self._closed.wait(config.LOG_FLUSH_INTERVAL):
+         self.flush()
+
+# sys.stderr is looked up every time, so that whatever replaces it (pytest) gets it.
+_stderr = _Sink(lambda text: sys.stderr.write(text), lambda: sys.stderr.flush())
+_json: t.Optional[_Sink] = None
+_json_file: t.Optional[t.TextIO] = None
+_json_path: t.Optional[str] = None
+
+def _json_sink() -> t.Optional[_Sink]:
+   global _json, _json_file, _json_path
+   if config.LOG_JSON_PATH != _json_path:
+      if _json is not None and _json_file is not None:
+         _json.close()
+         _json_file.close()
+      _json_path = config.LOG_JSON_PATH
+      _json = None
+      _json_file = None
+      if _json_path is not None:
+         _json_file = open(_json_path, "a", encoding="utf-8")
+         _json = _Sink(_json_file.write, _json_file.flush)
+   return _json
+
+def flush():
+   """
+   Call before anything else is written to the terminal, like a prompt.
+   """
+   _stderr.flush()
+   if _json is not None:
+      _json.flush()
+
+atexit.register(flush)
+
+def enabled(level: int) -> bool:
+   return level >= config.LOG_LEVEL
+
+def _log(level: int, prefix: str, v: t.Any):
+   if not enabled(level):
+      return
+   if callable(v):
+      v = v()
+   _stderr.write(_pretty_prefix(v, prefix))
+
+   json_sink = _json_sink()
+   if json_sink is not None:
+      group_spans = [s for s in _group_spans() if s is not None]
+      json_sink.write(json.dumps({
+         "time": time.time(),
+         "level": ["debug", "info", "warn", "error"][level],
+         "depth": _indent_level(),
+         "thread": threading.current_thread().name,
+         "span": group_spans[-1].name if len(group_spans) > 0 else None,
+         "message": v,
+      }, ensure_ascii=False, default=repr) + "\n")
+
+def _group_spans() -> list[t.Optional[spans.Span]]:
+   stack = getattr(_groups, "stack", None)
+   if stack is None:
+      stack = _groups.stack = []
+   return stack
+
+def group_start(span: t.Optional[str] = None, **args: t.Any):
+   """
+   A group with a span name is timed, see spans.
+   """
+   _groups.indent = _indent_level() + 1
+   _group_spans().append(None if span is None else spans.begin(span, **args))
 
 def group_end():
-   global _indent_level
-   if _indent_level > 1:
-      _indent_level -= 1
-   else:
-      _indent_level = 0
+   _groups.indent = max(_indent_level() - 1, 0)
+   stack = _group_spans()
+   if len(stack) > 0:
+      s = stack.pop()
+      if s is not None:
+         spans.end(s)
+
+# Each of these takes either what to log or a function that makes it, which is
+# only called if the level is on. Anything that isn't a str is pretty-printed.
 
-def debug(v):
-   if config.LOG_LEVEL < 1:
-      sys.stderr.write(_pretty_prefix(v, c.Fore.LIGHTBLACK_EX + "DBG"))
+def debug(v: t.Any):
+   _log(DEBUG, c.Fore.LIGHTBLACK_EX + "DBG", v)
 
-def info(v):
-   sys.stderr.write(_pretty_prefix(v, c.Fore.BLUE + "INF"))
+def info(v: t.Any):
+   _log(INFO, c.Fore.BLUE + "INF", v)
 
-def warn(v):
-   sys.stderr.write(_pretty_prefix(v, c.Fore.YELLOW + "WRN"))
+def warn(v: t.Any):
+   _log(WARN, c.Fore.YELLOW + "WRN", v)
 
-def error(v):
-   sys.stderr.write(_pretty_prefix(v, c.Fore.LIGHTRED_EX + "ERR"))
+def error(v: t.Any):
+   _log(ERROR, c.Fore.LIGHTRED_EX + "ERR", v)
@@ -1,13 +1,19 @@
 import colorama as c
 import bridge
+import config
+import plan
+import quota
+import yt
+import spans
 import log as l
 
 from prompt_toolkit import prompt
-from prompt_toolkit.shortcuts import choice
+from prompt_toolkit.shortcuts import choice, confirm
 from prompt_toolkit.completion import WordCompleter
 
 def specific(fn):
    filenames = bridge.my_playlist_files()
+   l.flush()
    for t in filenames:
       print(f" - {t}")
 
@@ -17,13 +23,31 @@ def specific(fn):
       l.error("Interrupt")
       exit()
    filename = filenames[filenames.index(title)]
-   fn(bridge.get_playlist_offline(filename))
+   p = bridge.get_playlist_offline(filename)
+   with spans.span(f"main.{fn.__name__}", playlist=p.shadow_file_object.title):
+      fn(p)
+
+def offline(fn):
+   """
+   Only look at snapshots of YouTube, no matter how old.
+   """
+   config.OFFLINE = True
+   return fn
 
 def full(fn):
-   filenames = bridge.my_playlists_online()
-   for p in filenames:
-      fn(p)
-   l.info(f"Processed {len(filenames)} playlists!")
+   processed = 0
+   for p in bridge.iter_playlists_online():
+      with spans.span(f"main.{fn.__name__}", playlist=p.shadow_file_object.title):
+         fn(p)
+      processed += 1
+   l.info(f"Processed {processed} playlists!")
+   l.info(f"HTTP cache: {yt.response_cache()}")
+   l.info(f"Traffic: {yt.traffic()}")
+   l.info(f"HTTP pool: {yt.pool()}")
+   l.group_start()
+   for line in yt.traffic().lines():
+      l.debug(line)
+   l.group_end()
 
 def analyze(p: bridge.Playlist):
    group_started = [False]
@@ -35,7 +59,7 @@ def analyze(p: bridge.Playlist):
 
    if len(p.missing_from_yt) > 0:
       group()
-      l.warn("Local Extra (Please Remove These)")
+      l.warn("Local Extra (Push Inserts These)")
       l.group_start()
       for extra in p.missing_from_yt:
          l.info(extra)
@@ -43,22 +67,24 @@ def analyze(p: bridge.Playlist):
 
    if len(p.missing_from_shadow) > 0:
       group()
-      l.warn("Local Missing:")
+      l.warn("Local Missing (Push Deletes These)")
       l.group_start()
       for missing in p.missing_from_shadow:
          l.info(missing)
       l.group_end()
 
-   if p.diff_ok:
-      if len(p.ooo) > 0:
-         group()
-         l.warn("Out-of-order:")
-         l.group_start()
-         for ooo in p.ooo:
-            l.warn(ooo)
-         l.group_end()
-   else:
-      l.warn("Refusing to calculate out-of-order items.")
+   if p.diff_ok and len(p.ooo) > 0:
+      group()
+      l.warn("Out-of-order:")
+      l.group_start()
+      for ooo in p.ooo:
+         l.warn(ooo)
+      l.group_end()
+
+   ops = p.plan_push()
+   if len(ops) > 0:
+      group()
+      l.info(f"Pushing would take {plan.count(ops)} for {plan.cost(ops)} of the {quota.remaining()} quota units left today")
 
    if group_started[0]:
       l.group_end()
@@ -70,7 +96,16 @@ def ingest(p: bridge.Playlist):
    l.group_end()
 
 def push(p: bridge.Playlist):
-   p.push()
+   def ask(changes: list[str]) -> bool:
+      l.warn(f"Pushing changes which tracks are in {p.shadow_file_object.title}:")
+      l.group_start()
+      for change in changes:
+         l.info(change)
+      l.group_end()
+      l.flush()
+      return confirm("Go ahead?")
+
+   p.push(ask)
 
 
 def reset(p: bridge.Playlist):
@@ -79,24 +114,42 @@ def reset(p: bridge.Playlist):
    p.reset_to_yt()
    l.group_end()
 
-print(f"{c.ansi.CSI}2J{c.ansi.CSI}H Welcome to the command-line interface for yu-playlist!")
-
-try:
-   what_to_do = choice(
-      message="How do you want to start?",
-      options=[
-         ("specific(analyze)", "Specific analysis"),
-         ("full(analyze)"    , "Full     analysis"),
-         ("specific(ingest)" , "Specific ingest"),
-         ("full(ingest)"     , "Full     ingest"),
-         ("specific(push)"   , "Specific push"),
-         ("full(reset)"      , "Full     reset to match YouTube"),
-         ("specific(reset)"  , "Specific reset to match YouTube"),
-      ],
-      default="specific_analysis",
-   )
-except KeyboardInterrupt:
-   l.error("Interrupt")
-   exit()
-
-eval(what_to_do)
+def duplicates():
+   found = bridge.playlist_index().duplicates()
+   for video_id, locations in found.items():
+      try:
+         l.info(bridge.videos()[video_id].title)
+      except KeyError:
+         l.info(video_id)
+      l.group_start()
+      for playlist_id, position in locations:
+         l.info(f"{bridge.playlist_index().title(playlist_id)} #{position + 1}")
+      l.group_end()
+   l.info(f"Found {len(found)} tracks in more than one place across {len(bridge.playlist_index())} playlists!")
+
+if __name__ == "__main__":
+   print(f"{c.ansi.CSI}2J{c.ansi.CSI}H Welcome to the command-line interface for yu-playlist!")
+
+   try:
+      what_to_do = choice(
+         message="How do you want to start?",
+         options=[
+            ("specific(analyze)"         , "Specific analysis"),
+            ("specific(offline(analyze))", "Specific analysis from snapshot"),
+            ("full(analyze)"             , "Full     analysis"),
+            ("specific(ingest)"          , "Specific ingest"),
+            ("full(ingest)"              , "Full     ingest"),
+            ("specific(push)"            , "Specific push"),
+            ("full(reset)"               , "Full     reset to match YouTube"),
+            ("specific(reset)"           , "Specific reset to match YouTube"),
+            ("duplicates()"              , "Duplicates across playlists"),
+         ],
+         default="specific_analysis",
+      )
+   except KeyboardInterrupt:
+      l.error("Interrupt")
+      exit()
+
+   with spans.span(what_to_do):
+      eval(what_to_do)
+   spans.report()
@@ -0,0 +1,136 @@
+# Planning the playlistItems.update/insert/delete calls that turn YouTube's
+# playlist into ours. Doesn't know about YouTube itself, only about how it moves
+# things around.
+from __future__ import annotations
+import typing as t
+import util as u
+import quota
+
+K = t.TypeVar("K", bound=t.Hashable)
+
+UPDATE_COST = quota.COSTS["update"]
+INSERT_COST = quota.COSTS["insert"]
+DELETE_COST = quota.COSTS["delete"]
+
+class Move(t.Generic[K]):
+   def __init__(self, key: K, position: int):
+      self.key = key
+      self.position = position
+      """
+      Where the item ends up, counted after it has been taken out of its old spot.
+      """
+
+   def __eq__(self, other: object) -> bool:
+      return isinstance(other, Move) and self.key == other.key and self.position == other.position
+
+   def __repr__(self) -> str:
+      return f"{self.key} -> {self.position}"
+
+class Insert(t.Generic[K]):
+   def __init__(self, key: K, position: int):
+      self.key = key
+      """
+      Something that isn't in the playlist yet.
+      """
+      self.position = position
+
+   def __eq__(self, other: object) -> bool:
+      return isinstance(other, Insert) and self.key == other.key and self.position == other.position
+
+   def __repr__(self) -> str:
+      return f"+ {self.key} -> {self.position}"
+
+class Delete(t.Generic[K]):
+   def __init__(self, key: K):
+      self.key = key
+
+   def __eq__(self, other: object) -> bool:
+      return isinstance(other, Delete) and self.key == other.key
+
+   def __repr__(self) -> str:
+      return f"- {self.key}"
+
+Op = t.Union[Move[K], Insert[K], Delete[K]]
+
+def simulate(order: list[K], ops: t.Sequence[Op[K]]) -> list[K]:
+   """
+   Applies ops the same way YouTube does. Setting the position of an item
+   takes it out of the playlist and puts it back in so that it lands at exactly
+   that index, shifting everything in between by one. Inserting also lands at
+   exactly that index.
+   """
+   order = list(order)
+   for op in ops:
+      if not isinstance(op, Insert):
+         order.remove(op.key)
+      if not isinstance(op, Delete):
+         order.insert(op.position, op.key)
+   return order
+
+def plan_moves(current: list[K], target: list[K]) -> list[Move[K]]:
+   """
+   The fewest moves that turn current into target, in the order they have to
+   be sent. Everything on a longest increasing subsequence stays put, and every
+   other item is placed right after whatever comes before it in target.
+   """
+   target_position = {key: i for i, key in enumerate(target)}
+   if len(target_position) != len(target) or len(current) != len(target) or any(key not in target_position for key in current):
+      raise ValueError("Can only plan moves between two orderings of the same distinct items!")
+
+   stay = {current[i] for i in u.longest_increasing_subsequence_indices([target_position[key] for key in current])}
+
+   # By the time we get to target[i], target[:i] is already in the right
+   # relative order, so putting it right after target[i - 1] can't be wrong.
+   order = list(current)
+   moves: list[Move[K]] = []
+   for i, key in enumerate(target):
+      if key in stay:
+         continue
+      order.remove(key)
+      position = 0 if i == 0 else order.index(target[i - 1]) + 1
+      order.insert(position, key)
+      moves.append(Move(key, position))
+
+   return moves
+
+def plan_edits(current: list[K], target: list[K]) -> list[Op[K]]:
+   """
+   The fewest ops that turn current into target, in the order they have to be
+   sent. Whatever isn't in target is deleted and whatever isn't in current is
+   inserted, both of which can't be helped. Deletes go first and inserts last,
+   so every insert lands right where it belongs and only what both have in
+   common ever gets moved.
+   """
+   if len(set(current)) != len(current) or len(set(target)) != len(target):
+      raise ValueError("Can only plan edits between two orderings of distinct items!")
+
+   in_current = set(current)
+   in_target = set(target)
+   ops: list[Op[K]] = [Delete(key) for key in current if key not in in_target]
+   ops.extend(plan_moves(
+      [key for key in current if key in in_target],
+      [key for key in target if key in in_current],
+   ))
+   # By now everything before target[i] that is in current is in the right
+   # order, and everything before it that isn't has just been inserted.
+   ops.extend(Insert(key, i) for i, key in enumerate(target) if key not in in_current)
+   return ops
+
+def cost(ops: t.Sequence[Op[K]]) -> int:
+   return sum(
+      INSERT_COST if isinstance(op, Insert) else DELETE_COST if isinstance(op, Delete) else UPDATE_COST
+      for op in ops
+   )
+
+def count(ops: t.Sequence[Op[K]]) -> str:
+   """
+   Like "2 inserts, 1 delete and 5 moves", leaving out whatever there's none of.
+   """
+   parts = []
+   for kind, name in [(Insert, "insert"), (Delete, "delete"), (Move, "move")]:
+      n = sum(isinstance(op, kind) for op in ops)
+      if n > 0:
+         parts.append(f"{n} {name}{'' if n == 1 else 's'}")
+   if len(parts) == 0:
+      return "nothing"
+   return " and ".join([", ".join(parts[:-1]), parts[-1]] if len(parts) > 1 else parts)
@@ -0,0 +1,111 @@
+# Keeping track of the units per day that the YouTube Data API gives us, so that
+# a run can tell up front whether it's going to make it.
+import datetime
+import threading
+import typing as t
+import util as u
+import config
+
+T = t.TypeVar("T")
+
+COSTS = {
+   "list": 1,
+   "insert": 50,
+   "update": 50,
+   "delete": 50,
+}
+"""
+Units charged per call, by the last part of the method id (youtube.playlistItems.list)
+"""
+
+_lock = threading.Lock()
+_day: t.Optional[str] = None
+_used = 0
+
+def _path() -> str:
+   return f"{config.PLAYLISTS_PATH}/.quota.json"
+
+def _today() -> str:
+   """
+   The quota resets at midnight Pacific time.
+   """
+   try:
+      from zoneinfo import ZoneInfo
+
+      pacific = ZoneInfo("America/Los_Angeles")
+   except Exception:
+      # No tzdata around (hello Windows), so ignore daylight saving.
+      pacific = datetime.timezone(datetime.timedelta(hours=-8))
+   return datetime.datetime.now(pacific).date().isoformat()
+
+def _sync():
+   """
+   Call with _lock held. Makes _day and _used reflect today.
+   """
+   global _day, _used
+   today = _today()
+   if _day == today:
+      return
+
+   _day = today
+   _used = 0
+   try:
+      with open(_path(), encoding="utf-8") as f:
+         saved = u.deserialize(f.read())
+      if saved["day"] == today:
+         _used = saved["used"]
+   except (FileNotFoundError, ValueError, KeyError):
+      pass
+
+def _save():
+   u.atomic_write(_path(), u.serialize({"day": _day, "used": _used}))
+
+def cost_of(method_id: str) -> int:
+   return COSTS[method_id.rsplit(".", 1)[-1]]
+
+def charge(units: int):
+   global _used
+   with _lock:
+      _sync()
+      _used += units
+      _save()
+
+def exhausted():
+   """
+   YouTube said quotaExceeded, so whatever we counted, there's nothing left.
+   """
+   global _used
+   with _lock:
+      _sync()
+      _used = max(_used, config.QUOTA_PER_DAY)
+      _save()
+
+def used() -> int:
+   with _lock:
+      _sync()
+      return _used
+
+def remaining() -> int:
+   return max(0, config.QUOTA_PER_DAY - used())
+
+def require(units: int, what: str):
+   if units > remaining():
+      raise ValueError(f"{what} needs {units} quota units but only {remaining()} are left today!")
+
+def schedule(jobs: list[T], cost: t.Callable[[T], int], last_done: t.Callable[[T], float]) -> tuple[list[T], list[T]]:
+   """
+   Splits jobs into the ones that fit in what's left of today's quota and the
+   ones that have to wait, favouring whatever was done the longest time ago.
+   Both come back in their original order.
+   """
+   budget = remaining()
+   fits: set[int] = set()
+   for i in sorted(range(len(jobs)), key=lambda i: (last_done(jobs[i]), cost(jobs[i]))):
+      if cost(jobs[i]) <= budget:
+         budget -= cost(jobs[i])
+         fits.add(i)
+
+   return (
+      [job for i, job in enumerate(jobs) if i in fits],
+      [job for i, job in enumerate(jobs) if i not in fits],
+   )
@@ -0,0 +1,66 @@
+# Shadow files as they were last parsed, so that loading every playlist is a
+# bulk read rather than decoding every line again.
+#
+# .parsed/<shadow file name>.marshal holds the key of the shadow file it was made
+# from along with textual.Playlist.dump() of it. A cache that doesn't match is
+# ignored and replaced.
+import os
+import hashlib
+import marshal
+import typing as t
+import textual
+import spans
+import config
+
+FORMAT = 1
+"""
+Bump whenever textual.Playlist.dump() changes shape.
+"""
+
+def _path(shadow_path: str) -> str:
+   name = os.path.basename(shadow_path).removesuffix(".jsonl")
+   return f"{config.PLAYLISTS_PATH}/.parsed/{name}.marshal"
+
+def _key(f: t.TextIO) -> tuple[int, int, int, bytes]:
+   stat = os.fstat(f.fileno())
+   # A bit at a time, so that the whole file is never held at once.
+   digest = hashlib.blake2b(digest_size=16)
+   f.seek(0)
+   for chunk in iter(lambda: f.read(64 * 1024), ""):
+      digest.update(chunk.encode())
+   return (FORMAT, stat.st_mtime_ns, stat.st_size, digest.digest())
+
+def _load(path: str, key: tuple[int, int, int, bytes]) -> t.Optional[textual.Playlist]:
+   try:
+      # marshal.load() on a file reads it a few bytes at a time, so read it all.
+      with open(path, "rb") as f:
+         cached_key, dump = marshal.loads(f.read())
+   except (FileNotFoundError, EOFError, ValueError, TypeError):
+      return None
+   if cached_key != key:
+      return None
+   return textual.Playlist(dump)
+
+def _save(path: str, key: tuple[int, int, int, bytes], playlist: textual.Playlist):
+   os.makedirs(os.path.dirname(path), exist_ok=True)
+   with open(f"{path}.tmp", "wb") as f:
+      # Version 2 leaves out the bookkeeping of later versions that makes loading
+      # slower. It also forgets which strings were interned.
+      f.write(marshal.dumps((key, playlist.dump()), 2))
+   os.replace(f"{path}.tmp", path)
+
+@spans.traced
+def parse(f: t.TextIO) -> textual.Playlist:
+   """
+   textual.Playlist of the shadow file open as f, read from the start.
+   """
+   key = _key(f)
+   path = _path(f.name)
+
+   playlist = _load(path, key)
+   if playlist is None:
+      # Read again, this time line by line.
+      f.seek(0)
+      playlist = textual.Playlist(f)
+      _save(path, key, playlist)
+   return playlist
@@ -0,0 +1,66 @@
+# Local copies of what YouTube said a playlist looked like, so that looking at
+# the same playlist over and over while editing it doesn't ask YouTube every time.
+import os
+import time
+import typing as t
+import util as u
+import yt
+import config
+
+def _path(playlist_id: str) -> str:
+   return f"{config.PLAYLISTS_PATH}/.snapshots/{playlist_id}.json"
+
+def save(playlist: yt.Playlist):
+   u.atomic_write(_path(playlist.id), u.serialize({
+      "time": time.time(),
+      "playlist": playlist.dump(),
+      "items": [item.dump() for item in playlist.items],
+   }))
+
+def synced_at(playlist_id: str) -> float:
+   """
+   When the playlist was last fetched, or -inf if it never was.
+   """
+   try:
+      return os.path.getmtime(_path(playlist_id))
+   except FileNotFoundError:
+      return float("-inf")
+
+def _read(playlist_id: str) -> t.Optional[t.Any]:
+   try:
+      with open(_path(playlist_id), encoding="utf-8") as f:
+         return u.deserialize(f.read())
+   except FileNotFoundError:
+      return None
+
+def _items(snap: t.Any) -> list[yt.PlaylistItem]:
+   return [yt.PlaylistItem(item) for item in snap["items"]]
+
+def load(playlist_id: str, ttl: t.Optional[float] = None) -> t.Optional[yt.Playlist]:
+   """
+   None if there is no snapshot, or if it's more than ttl seconds old.
+   """
+   snap = _read(playlist_id)
+   if snap is None:
+      return None
+
+   if ttl is not None and time.time() - snap["time"] > ttl:
+      return None
+
+   playlist = yt.Playlist(snap["playlist"])
+   playlist.items = _items(snap)
+   return playlist
+
+def unchanged_items(playlist: yt.Playlist) -> t.Optional[list[yt.PlaylistItem]]:
+   """
+   The items from the snapshot if YouTube says that the playlist hasn't changed
+   since then, no matter how old the snapshot is. None if it might have.
+   """
+   snap = _read(playlist.id)
+   if snap is None or playlist.etag is None:
+      return None
+
+   if snap["playlist"].get("etag") != playlist.etag or snap["playlist"]["contentDetails"]["itemCount"] != playlist.length:
+      return None
+
+   return _items(snap)
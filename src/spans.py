@@ -0,0 +1,157 @@
+# Where the time of a run goes. A span is a named stretch of time on one thread,
+# and spans on the same thread nest. log groups with a name are spans, and so is
+# every request to YouTube and every stage of a bridge.Playlist.
+#
+# At the end of a run, report() prints how long each kind of span took and, if
+# config.TRACE_PATH is set, writes every span there as a Chrome trace (open it
+# in https://ui.perfetto.dev or chrome://tracing).
+from __future__ import annotations
+import os
+import time
+import functools
+import threading
+import typing as t
+import contextlib
+import util as u
+import log as l
+import config
+
+F = t.TypeVar("F", bound=t.Callable[..., t.Any])
+
+class Span:
+   # A full run has one for every page of every playlist.
+   __slots__ = ("name", "args", "thread", "start", "end", "children")
+
+   def __init__(self, name: str, args: dict[str, t.Any]):
+      self.name = name
+      self.args = args
+      self.thread = threading.get_ident()
+      self.start = time.perf_counter_ns()
+      self.end: t.Optional[int] = None
+      self.children = 0
+      """
+      Nanoseconds spent in spans directly inside this one.
+      """
+
+   @property
+   def duration(self) -> int:
+      return (self.end if self.end is not None else time.perf_counter_ns()) - self.start
+
+_lock = threading.Lock()
+_spans: list[Span] = []
+"""
+Finished spans, in the order they finished.
+"""
+_threads: dict[int, str] = {}
+_local = threading.local()
+
+def _stack() -> list[Span]:
+   stack = getattr(_local, "stack", None)
+   if stack is None:
+      stack = _local.stack = []
+      with _lock:
+         _threads[threading.get_ident()] = threading.current_thread().name
+   return stack
+
+def begin(name: str, **args: t.Any) -> Span:
+   span = Span(name, args)
+   _stack().append(span)
+   return span
+
+def end(span: Span):
+   """
+   Also ends whatever was started inside span and never ended, which is what
+   an exception does to log groups.
+   """
+   stack = _stack()
+   if span not in stack:
+      return
+   now = time.perf_counter_ns()
+   while len(stack) > 0:
+      inner = stack.pop()
+      inner.end = now
+      if len(stack) > 0:
+         stack[-1].children += inner.duration
+      with _lock:
+         _spans.append(inner)
+      if inner is span:
+         break
+
+@contextlib.contextmanager
+def span(name: str, **args: t.Any) -> t.Iterator[Span]:
+   s = begin(name, **args)
+   try:
+      yield s
+   finally:
+      end(s)
+
+def traced(fn: F) -> F:
+   """
+   Makes every call to fn a span named after it.
+   """
+   name = f"{fn.__module__}.{fn.__qualname__}"
+
+   @functools.wraps(fn)
+   def wrapper(*args: t.Any, **kwargs: t.Any) -> t.Any:
+      with span(name):
+         return fn(*args, **kwargs)
+   return t.cast(F, wrapper)
+
+def reset():
+   with _lock:
+      _spans.clear()
+
+def summary() -> list[tuple[str, int, int, int]]:
+   """
+   (name, calls, total ns, self ns) of every kind of span, the slowest first.
+   Self time leaves out the spans inside. Spans on different threads overlap,
+   so totals can add up to more than the run took.
+   """
+   totals: dict[str, list[int]] = {}
+   with _lock:
+      for s in _spans:
+         total = totals.setdefault(s.name, [0, 0, 0])
+         total[0] += 1
+         total[1] += s.duration
+         total[2] += s.duration - s.children
+   return sorted(((name, *total) for name, total in totals.items()), key=lambda row: row[2], reverse=True) # type: ignore
+
+def chrome_trace() -> dict[str, t.Any]:
+   """
+   Every finished span in the Trace Event Format, in microseconds.
+   """
+   pid = os.getpid()
+   with _lock:
+      spans = list(_spans)
+      threads = dict(_threads)
+   origin = min((s.start for s in spans), default=0)
+   events: list[dict[str, t.Any]] = [
+      {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+      for tid, name in threads.items()
+   ]
+   for s in spans:
+      events.append({
+         "name": s.name,
+         "cat": s.name.split(".", 1)[0],
+         "ph": "X",
+         "ts": (s.start - origin) / 1000,
+         "dur": s.duration / 1000,
+         "pid": pid,
+         "tid": s.thread,
+         "args": s.args,
+      })
+   return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+def report():
+   rows = summary()
+   if len(rows) > 0:
+      width = max(len(name) for name, *_ in rows)
+      l.info(f"{'Span':<{width}}  {'calls':>6}  {'total ms':>10}  {'self ms':>10}")
+      l.group_start()
+      for name, calls, total, self_ in rows:
+         l.info(f"{name:<{width}}  {calls:>6}  {total / 1e6:>10.1f}  {self_ / 1e6:>10.1f}")
+      l.group_end()
+
+   if config.TRACE_PATH is not None:
+      u.atomic_write(config.TRACE_PATH, u.serialize(chrome_trace()))
+      l.info(f"Wrote a trace of {len(_spans)} spans to {config.TRACE_PATH}")
@@ -2,14 +2,20 @@
 # Unfortunately it also knows the internal structure of yt, but it at least does
 # not know about the filesystem.
 from __future__ import annotations
+import io
+import sys
+import itertools
 import util as u
 import typing as t
 import yt
 import log as l
+import spans
 
 from time import time
 
 class Video:
+   __slots__ = ("id", "title", "channel_title")
+
    def __init__(self, source: t.Union[str, yt.PlaylistItem]):
       self.id: str
       self.title: str
@@ -31,9 +37,9 @@ class Video:
             l.group_end()
             raise e
 
-         self.id = obj[0]
+         self.id = u.intern(obj[0])
          self.title = obj[1]
-         self.channel_title = obj[2]
+         self.channel_title = u.intern(obj[2])
 
          if more_line != "":
             raise ValueError(f"Uninterpreted text near {u.serialize(source)}!")
@@ -53,26 +59,45 @@ class Videos:
    def __init__(self, source: t.Union[str, list[yt.PlaylistItem]] = []):
       """
       Either the jsonl of the .videos.jsonl, or a list of all PlaylistItems.
+
+      .videos.jsonl is an append-only log where the last record for an id wins.
       """
       self._order: list[Video] = []
       self._lookup: t.Dict[str, Video] = {}
+      self._pending: t.Dict[str, Video] = {}
+      """
+      Videos that are new or have changed since the log was last written.
+      """
+      self.records = 0
+      """
+      How many records the log has, stale ones included.
+      """
+      self._must_compact = False
 
       if isinstance(source, list):
          self._add(map(Video, source))
          return
 
       if isinstance(source, str):
-         self._add(map(Video, source.splitlines()))
+         lines = [line for line in source.splitlines() if line.strip() != ""]
+         self._add(map(Video, lines))
+         self.records = len(lines)
+         self._pending.clear()
          return
 
       raise TypeError(f"SANITY: Unexpected {type(source)}")
 
    def _add(self, videos: t.Iterator[Video]):
       for video in videos:
-         if video.id in self._lookup:
-            self._lookup[video.id].update(video)
-         self._lookup[video.id] = video
-         self._order.append(video)
+         existing = self._lookup.get(video.id)
+         if existing is None:
+            self._lookup[video.id] = video
+            self._order.append(video)
+         elif existing.title == video.title and existing.channel_title == video.channel_title:
+            continue
+         else:
+            existing.update(video)
+         self._pending[video.id] = self._lookup[video.id]
 
    def add(self, source: list[yt.PlaylistItem]):
       self._add(map(Video, source))
@@ -87,20 +112,66 @@ class Videos:
       raise TypeError(f"SANITY: Unexpected {type(key)}")
 
    def __delitem__(self, key: int | str) -> None:
+      # There's no way to append a deletion, so the log has to be rewritten.
+      self._must_compact = True
+
       if isinstance(key, int):
+         self._pending.pop(self._order[key].id, None)
          del self._lookup[self._order[key].id]
          del self._order[key]
          return
 
       if isinstance(key, str):
+         self._pending.pop(key, None)
          self._order.remove(self._lookup[key])
          del self._lookup[key]
          return
 
       raise TypeError(f"SANITY: Unexpected {type(key)}")
 
+   def __len__(self) -> int:
+      return len(self._order)
+
+   @property
+   def garbage_ratio(self) -> float:
+      """
+      How much of the log would be stale once the pending videos are appended.
+      """
+      if self._must_compact:
+         return 1.0
+
+      records = self.records + len(self._pending)
+      if records == 0:
+         return 0.0
+      return (records - len(self._order)) / records
+
+   def pending_jsonl(self) -> str:
+      """
+      The records to append to the log. They count as written afterwards.
+      """
+      out = "".join(v.jsonl() + "\n" for v in self._pending.values())
+      self.records += len(self._pending)
+      self._pending.clear()
+      return out
+
+   def compact_jsonl(self) -> str:
+      """
+      The whole log with one record per video. It counts as written afterwards.
+      """
+      out = self.jsonl()
+      self.records = len(self._order)
+      self._pending.clear()
+      self._must_compact = False
+      return out
+
    def jsonl(self) -> str:
-      return "\n".join(v.jsonl() for v in self._order) + "\n"
+      return "".join(v.jsonl() + "\n" for v in self._order)
+
+_NO_COMMENT: list[str] = []
+"""
+Shared by every item without a comment above it. Nothing appends to an item's
+above_comment, it only ever gets replaced.
+"""
 
 class PlaylistItem:
    """
@@ -108,7 +179,9 @@ class PlaylistItem:
    friendly jsonl file.
    """
 
-   def __init__(self, source: t.Union[str, yt.PlaylistItem], above_comment: list[str] = []):
+   __slots__ = ("title", "channel_title", "friendly_title", "friendly_channel_title", "video_id", "smol_hash", "above_comment", "inline_comment")
+
+   def __init__(self, source: t.Union[str, yt.PlaylistItem, tuple[str, t.Optional[str], str, str]], above_comment: list[str] = []):
       # Depending on how the object is made, these strings may not be known.
       # Instead, a friendly title and friendly channel_title will be known, and do not require truncation.
       self.title: t.Optional[str] = None
@@ -123,7 +196,7 @@ class PlaylistItem:
 
       self.video_id: str
       self.smol_hash: str
-      self.above_comment = above_comment
+      self.above_comment = above_comment or _NO_COMMENT
 
       self.inline_comment: t.Optional[str] = None
       """
@@ -140,13 +213,19 @@ class PlaylistItem:
          if self.friendly_channel_title is not None:
             if self.friendly_channel_title.endswith(" - Topic"):
                self.friendly_channel_title = self.friendly_channel_title[: -len(" - Topic")]
-            self.friendly_channel_title = u.truncate(self.friendly_channel_title, max_len=20)
+            self.friendly_channel_title = u.intern(u.truncate(self.friendly_channel_title, max_len=20))
 
          self.video_id = source.video_id
          self.smol_hash = u.smol_hash(source.id)
 
          return
 
+      if isinstance(source, tuple):
+         # source is an already parsed line, without its inline comment, and
+         # with its strings already interned where that pays off.
+         self.friendly_title, self.friendly_channel_title, self.video_id, self.smol_hash = source
+         return
+
       if isinstance(source, str):
          # source is a single line of json
          try:
@@ -158,8 +237,8 @@ class PlaylistItem:
             l.group_end()
             raise e
          self.friendly_title = obj[0]
-         self.friendly_channel_title = obj[1]
-         self.video_id = obj[2]
+         self.friendly_channel_title = u.intern(obj[1])
+         self.video_id = u.intern(obj[2])
          self.smol_hash = obj[3]
 
          more_line2 = more_line.strip()
@@ -169,7 +248,7 @@ class PlaylistItem:
          elif more_line2.startswith("//"):
             self.inline_comment = more_line
          else:
-            raise ValueError(f"Unexpected text {u.serialize(more_line2)} after {self.title}!")
+            raise ValueError(f"Unexpected text {u.serialize(more_line2)} after {self.friendly_title}!")
 
          return
 
@@ -184,10 +263,11 @@ class PlaylistItem:
       return f"{self.title} - {self.channel_title}"
 
 class Playlist:
-   def __init__(self, source: t.Union[str, yt.Playlist]):
+   def __init__(self, source: t.Union[str, t.TextIO, yt.Playlist, dict[str, t.Any]]):
       """
       If you're initializing this with a yt.Playlist, you're probably only looking for the .jsonl
       functionality so that you can immediately write out to disk.
+      A file is read line by line from wherever it's at. A dict is whatever dump() gave.
       """
       self.title: str
       self.playlist_comment: list[str] = []
@@ -202,54 +282,132 @@ class Playlist:
          self.items = [PlaylistItem(item) for item in source.items]
          return
 
-      if isinstance(source, str):
-         jsonl = [line.strip() for line in source.splitlines()]
-
-         title = u.deserialize(jsonl.pop(0))
-         if not isinstance(title, str):
-            raise ValueError("Title must be a string!")
-         self.title: str = title
-
-         # I will allow a playlist comment on the second line.
-         while jsonl[0].startswith("//"):
-            self.playlist_comment.append(jsonl.pop(0))
+      if isinstance(source, dict):
+         self.title = source["title"]
+         self.playlist_comment = source["playlist_comment"]
+         self.id = source["id"]
+         self.time = source["time"]
+         rows = zip(source["friendly_titles"], *_intern_columns(source["friendly_channel_titles"], source["video_ids"], source["smol_hashes"]))
+         for row, above_comment, inline_comment in zip(rows, source["above_comments"], source["inline_comments"]):
+            item = PlaylistItem(row, above_comment)
+            item.inline_comment = inline_comment
+            self.items.append(item)
+         return
 
-         id_ = u.deserialize(jsonl.pop(0))
-         if not isinstance(id_, str):
-            raise ValueError("id must be a string!")
-         self.id: str = id_
+      if isinstance(source, (str, io.TextIOBase)):
+         self._parse(source)
+         return
 
-         time_ = u.deserialize(jsonl.pop(0))
-         if not isinstance(time_, float):
-            raise ValueError("time must be a float!")
-         self.time: float = time_
+      raise TypeError(f"SANITY: Unexpected type {type(source)}")
 
-         lines_and_comments: list[tuple[str, list[str]]] = []
-         comment_above = []
-         for line in jsonl:
-            line = line.strip()
+   def _parse(self, source: t.Union[str, t.TextIO]):
+      lines = enumerate(_lines(source), 1)
 
-            if line == "":
-               continue
+      def header(what: str) -> tuple[int, str]:
+         try:
+            return next(lines)
+         except StopIteration:
+            raise ValueError(f"Shadow playlist ends before its {what}!") from None
+
+      def value(what: str, type_: type) -> t.Any:
+         lineno, line = header(what)
+         return self._header_value(lineno, line, what, type_)
+
+      self.title = value("title", str)
+
+      # I will allow a playlist comment on the second line.
+      lineno, line = header("id")
+      while line.startswith("//"):
+         self.playlist_comment.append(line)
+         lineno, line = header("id")
+      self.id = self._header_value(lineno, line, "id", str)
+
+      self.time = value("time", float)
+
+      run: list[tuple[int, str, list[str]]] = []
+      comment_above: list[str] = []
+      for lineno, line in lines:
+         if line.startswith("[") and line.endswith("]"):
+            run.append((lineno, line, comment_above))
+            comment_above = []
+            if len(run) == _RUN_LENGTH:
+               self._add_run(run)
+               run = []
+         elif line == "":
+            continue
+         elif line.startswith("//"):
+            comment_above.append(line)
+         else:
+            # There's something after the row, hopefully an inline comment.
+            self._add_run(run)
+            run = []
+            self._add_run([(lineno, line, comment_above)])
+            comment_above = []
 
-            if line.startswith("//"):
-               comment_above.append(line)
-               continue
+      self._add_run(run)
 
-            lines_and_comments.append((line, comment_above))
-            comment_above = []
+   @staticmethod
+   def _header_value(lineno: int, line: str, what: str, type_: type) -> t.Any:
+      try:
+         v = u.deserialize(line)
+      except u.JSONDecodeError as e:
+         raise ValueError(f"Line {lineno}: Bad {what}: {e}") from e
+      if not isinstance(v, type_):
+         raise ValueError(f"Line {lineno}: {what} must be a {type_.__name__}!")
+      return v
 
-         self.items = [PlaylistItem(line, comment_above) for line, comment_above in lines_and_comments]
+   def _add_run(self, run: list[tuple[int, str, list[str]]]):
+      """
+      Decodes lines that look like nothing but a row in one go. If they turn out
+      not to be exactly one well formed row each, they are decoded one by one,
+      which is also what complains about whatever is wrong with them.
+      """
+      if len(run) == 0:
          return
 
-      raise TypeError(f"SANITY: Unexpected type {type(source)}")
+      if len(run) > 1:
+         try:
+            rows = u.deserialize("[" + ",\n".join(line for _, line, _ in run) + "]")
+         except u.JSONDecodeError:
+            rows = None
+         if rows is not None and len(rows) == len(run) and _are_rows(rows):
+            friendly_titles, *columns = zip(*rows)
+            for row, (_, _, comment_above) in zip(zip(friendly_titles, *_intern_columns(*columns)), run):
+               item = PlaylistItem(row, comment_above)
+               item.inline_comment = ""
+               self.items.append(item)
+            return
+
+      for lineno, line, comment_above in run:
+         try:
+            self.items.append(PlaylistItem(line, comment_above))
+         except (ValueError, IndexError, KeyError, TypeError) as e:
+            raise ValueError(f"Line {lineno}: {e}") from e
 
-   def jsonl(self) -> str:
-      jsonl_out = ""
-      jsonl_out += u.serialize(self.title) + "\n"
-      jsonl_out += "".join(line + "\n" for line in self.playlist_comment)
-      jsonl_out += u.serialize(self.id) + "\n"
-      jsonl_out += u.serialize(self.time) + "\n"
+   def dump(self) -> dict[str, t.Any]:
+      """
+      Everything the shadow file says, one column per field, made of nothing but
+      dicts, lists, strs, floats and None.
+      """
+      return {
+         "title": self.title,
+         "playlist_comment": self.playlist_comment,
+         "id": self.id,
+         "time": self.time,
+         "friendly_titles": [item.friendly_title for item in self.items],
+         "friendly_channel_titles": [item.friendly_channel_title for item in self.items],
+         "video_ids": [item.video_id for item in self.items],
+         "smol_hashes": [item.smol_hash for item in self.items],
+         "above_comments": [item.above_comment for item in self.items],
+         "inline_comments": [item.inline_comment for item in self.items],
+      }
+
+   @spans.traced
+   def write_jsonl(self, f: t.TextIO):
+      f.write(u.serialize(self.title) + "\n")
+      f.write("".join(line + "\n" for line in self.playlist_comment))
+      f.write(u.serialize(self.id) + "\n")
+      f.write(u.serialize(self.time) + "\n")
 
       cols: tuple[list[str], list[str], list[str], list[str]] = ([], [], [], [])
       for i in self.items:
@@ -262,10 +420,47 @@ class Playlist:
          u.left_align(col)
 
       for i, item in enumerate(self.items):
-         jsonl_out += "".join(line + "\n" for line in item.above_comment)
-         jsonl_out += f"[{cols[0][i]}, {cols[1][i]}, {cols[2][i]}, {cols[3][i]}]"
-         if item.inline_comment:
-            jsonl_out += item.inline_comment
-         jsonl_out += "\n"
+         f.write(
+            "".join(line + "\n" for line in item.above_comment)
+            + f"[{cols[0][i]}, {cols[1][i]}, {cols[2][i]}, {cols[3][i]}]"
+            + (item.inline_comment or "")
+            + "\n"
+         )
 
-      return jsonl_out
+   def jsonl(self) -> str:
+      out = io.StringIO()
+      self.write_jsonl(out)
+      return out.getvalue()
+
+_RUN_LENGTH = 512
+"""
+Most rows decoded at once, so that a file isn't held in memory all at once.
+"""
+
+def _lines(source: t.Union[str, t.TextIO]) -> t.Iterator[str]:
+   """
+   Stripped lines, split exactly like str.splitlines() would split the whole
+   thing, even though a file is only read one line at a time.
+   """
+   if isinstance(source, str):
+      yield from map(str.strip, source.splitlines())
+      return
+
+   for physical_line in source:
+      for line in physical_line.splitlines():
+         yield line.strip()
+
+def _intern_columns(friendly_channel_titles: t.Iterable[t.Optional[str]], video_ids: t.Iterable[str], smol_hashes: t.Iterable[str]) -> tuple[list[t.Optional[str]], list[str], list[str]]:
+   # smol_hashes aren't worth it, bridge shares the ones for YouTube's side with these.
+   return u.intern_column(friendly_channel_titles), list(map(sys.intern, video_ids)), list(smol_hashes)
+
+def _are_rows(rows: list[t.Any]) -> bool:
+   """
+   Whether every one of rows is a list of 4 strs or Nones. Anything else could
+   mean that a line wasn't a row on its own.
+   """
+   return (
+      set(map(type, rows)) <= {list}
+      and set(map(len, rows)) <= {4}
+      and set(map(type, itertools.chain.from_iterable(rows))) <= {str, type(None)}
+   )
@@ -0,0 +1,307 @@
+# What sits between the yt client and the network.
+# Everything in here speaks httplib2, since that's what googleapiclient wants.
+import os
+import time
+import queue
+import hashlib
+import threading
+import typing as t
+
+import httplib2
+
+import util as u
+
+_wire = threading.local()
+_opened_lock = threading.Lock()
+_opened = 0
+
+def wire_bytes() -> int:
+   """
+   Bytes of response bodies this thread has read off the network so far, as
+   they came, so before decompression.
+   """
+   return getattr(_wire, "bytes", 0)
+
+def connections_opened() -> int:
+   """
+   How many connections MeteredHttp has opened, each a TLS handshake for https.
+   """
+   return _opened
+
+def _count_connect():
+   global _opened
+   with _opened_lock:
+      _opened += 1
+
+def _counted(response: t.Any) -> t.Any:
+   read = response.read
+
+   def counted_read(*args: t.Any, **kwargs: t.Any) -> bytes:
+      data = read(*args, **kwargs)
+      _wire.bytes = wire_bytes() + len(data)
+      return data
+
+   response.read = counted_read
+   return response
+
+class _MeteredHTTPConnection(httplib2.HTTPConnectionWithTimeout):
+   def connect(self):
+      _count_connect()
+      super().connect()
+
+   def getresponse(self) -> t.Any:
+      return _counted(super().getresponse())
+
+class _MeteredHTTPSConnection(httplib2.HTTPSConnectionWithTimeout):
+   def connect(self):
+      _count_connect()
+      super().connect()
+
+   def getresponse(self) -> t.Any:
+      return _counted(super().getresponse())
+
+class CachedResponse:
+   def __init__(self, etag: str, headers: dict[str, str], body: bytes):
+      self.etag = etag
+      self.headers = headers
+      self.body = body
+
+class DiskCache:
+   """
+   ETags and bodies of GET responses, keyed by URI. Once the bodies take up more
+   than max_bytes, the least recently used ones are thrown out.
+   """
+
+   def __init__(self, path: str, max_bytes: int):
+      self.path = path
+      self.max_bytes = max_bytes
+      self.hits = 0
+      self.misses = 0
+      self.size = 0
+
+      self._lock = threading.Lock()
+      self._entries: dict[str, int] = {}
+      """
+      filename -> size on disk, least recently used first
+      """
+
+      os.makedirs(path, exist_ok=True)
+      by_age = sorted(os.scandir(path), key=lambda entry: entry.stat().st_mtime)
+      for entry in by_age:
+         if entry.name.endswith(".tmp"):
+            os.remove(entry.path)
+            continue
+         self._entries[entry.name] = entry.stat().st_size
+         self.size += entry.stat().st_size
+
+   def _filename(self, uri: str) -> str:
+      return hashlib.sha256(uri.encode()).hexdigest()
+
+   def get(self, uri: str) -> t.Optional[CachedResponse]:
+      filename = self._filename(uri)
+      with self._lock:
+         if filename not in self._entries:
+            return None
+         # Move it to the most recently used end.
+         self._entries[filename] = self._entries.pop(filename)
+
+      try:
+         with open(f"{self.path}/{filename}", "rb") as f:
+            header, body = f.read().split(b"\n", 1)
+         os.utime(f"{self.path}/{filename}")
+      except (FileNotFoundError, ValueError):
+         return None
+
+      meta = u.deserialize(header.decode())
+      if meta["uri"] != uri:
+         return None
+      return CachedResponse(meta["etag"], meta["headers"], body)
+
+   def put(self, uri: str, response: CachedResponse):
+      filename = self._filename(uri)
+      header = u.serialize({"uri": uri, "etag": response.etag, "headers": response.headers}).encode()
+      data = header + b"\n" + response.body
+      if len(data) > self.max_bytes:
+         return
+
+      with self._lock:
+         tmp = f"{self.path}/{filename}.{threading.get_ident()}.tmp"
+         with open(tmp, "wb") as f:
+            f.write(data)
+         os.replace(tmp, f"{self.path}/{filename}")
+
+         self.size += len(data) - self._entries.pop(filename, 0)
+         self._entries[filename] = len(data)
+
+         while self.size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self.size -= self._entries.pop(oldest)
+            try:
+               os.remove(f"{self.path}/{oldest}")
+            except FileNotFoundError:
+               pass
+
+   def count(self, hit: bool):
+      with self._lock:
+         if hit:
+            self.hits += 1
+         else:
+            self.misses += 1
+
+   def __repr__(self) -> str:
+      return f"{self.hits} hits, {self.misses} misses, {len(self._entries)} entries, {self.size / 2**20:.1f} MiB"
+
+class ConditionalHttp:
+   """
+   Wraps an httplib2.Http so that GETs it has seen an ETag for are sent with
+   If-None-Match, and a 304 is answered with the body from the cache.
+   """
+
+   def __init__(self, http: httplib2.Http, cache: DiskCache):
+      self.http = http
+      self.cache = cache
+
+   def request(self, uri: str, method: str = "GET", body: t.Any = None, headers: t.Optional[dict[str, str]] = None, *args, **kwargs) -> tuple[httplib2.Response, bytes]:
+      if method != "GET":
+         return self.http.request(uri, method, body, headers, *args, **kwargs)
+
+      headers = dict(headers or {})
+      cached = self.cache.get(uri)
+      if cached is not None:
+         headers["if-none-match"] = cached.etag
+
+      response, content = self.http.request(uri, method, body, headers, *args, **kwargs)
+
+      if response.status == 304 and cached is not None:
+         self.cache.count(hit=True)
+         response = httplib2.Response({**cached.headers, "status": "200"})
+         response.fromcache = True
+         return response, cached.body
+
+      self.cache.count(hit=False)
+      etag = response.get("etag")
+      if response.status == 200 and etag is not None:
+         headers_to_keep = {k: v for k, v in response.items() if k in ("content-type", "etag")}
+         self.cache.put(uri, CachedResponse(etag, headers_to_keep, content))
+      return response, content
+
+   def __getattr__(self, name: str) -> t.Any:
+      return getattr(self.http, name)
+
+class MeteredHttp:
+   """
+   Wraps an httplib2.Http so that wire_bytes() counts what its responses take
+   up on the wire. httplib2 decompresses bodies before anyone else sees them.
+   """
+
+   def __init__(self, http: httplib2.Http):
+      self.http = http
+
+   def request(self, uri: str, method: str = "GET", body: t.Any = None, headers: t.Optional[dict[str, str]] = None, redirections: int = httplib2.DEFAULT_MAX_REDIRECTS, connection_type: t.Any = None) -> tuple[httplib2.Response, bytes]:
+      if connection_type is None:
+         connection_type = _MeteredHTTPSConnection if uri.startswith("https:") else _MeteredHTTPConnection
+      return self.http.request(uri, method, body, headers, redirections, connection_type)
+
+   def __getattr__(self, name: str) -> t.Any:
+      return getattr(self.http, name)
+
+class PooledHttp:
+   """
+   A thread-safe stand-in for an httplib2.Http. Every request borrows one of at
+   most size httplib2.Https from make(), along with the connections it keeps
+   alive, and waits for one to come back if they're all busy. The most recently
+   used one goes first, since its connections are the likeliest to still be
+   open. Connections that sat unused for longer than keep_alive seconds are
+   closed rather than reused, since the other end has probably given up on them.
+   """
+
+   def __init__(self, make: t.Callable[[], httplib2.Http], size: int, keep_alive: float):
+      if size < 1:
+         raise ValueError("Pool needs room for at least one connection!")
+      self._make = make
+      self.size = size
+      self.keep_alive = keep_alive
+      self.created = 0
+      self.waits = 0
+      """
+      How many requests had to wait for another to finish first.
+      """
+      self.expired = 0
+
+      self._lock = threading.Lock()
+      self._idle: queue.LifoQueue[tuple[httplib2.Http, float]] = queue.LifoQueue()
+      """
+      (http, when it was last returned)
+      """
+
+   def _borrow(self) -> httplib2.Http:
+      try:
+         http, returned = self._idle.get_nowait()
+      except queue.Empty:
+         with self._lock:
+            make = self.created < self.size
+            if make:
+               self.created += 1
+            else:
+               self.waits += 1
+         if make:
+            return self._make()
+         http, returned = self._idle.get()
+
+      if time.monotonic() - returned > self.keep_alive and len(http.connections) > 0:
+         with self._lock:
+            self.expired += 1
+         http.close()
+      return http
+
+   def request(self, *args: t.Any, **kwargs: t.Any) -> tuple[httplib2.Response, bytes]:
+      http = self._borrow()
+      try:
+         return http.request(*args, **kwargs)
+      finally:
+         self._idle.put((http, time.monotonic()))
+
+   def close(self):
+      while True:
+         try:
+            http, _ = self._idle.get_nowait()
+         except queue.Empty:
+            break
+         http.close()
+         with self._lock:
+            self.created -= 1
+
+   def __repr__(self) -> str:
+      return f"{self.created} of {self.size} clients made, {self.waits} waits, {self.expired} expired, {connections_opened()} connections opened"
+
+class Traffic:
+   """
+   Per method id, how many responses there were, how many bytes they took on
+   the wire and once decompressed, and how long decoding them took.
+   """
+
+   def __init__(self):
+      self._lock = threading.Lock()
+      self.by_method: dict[str, list[float]] = {}
+      """
+      method id -> [responses, wire bytes, body bytes, decode seconds]
+      """
+
+   def record(self, method_id: str, wire: int, body: int, decode: float):
+      with self._lock:
+         totals = self.by_method.setdefault(method_id, [0, 0, 0, 0.0])
+         totals[0] += 1
+         totals[1] += wire
+         totals[2] += body
+         totals[3] += decode
+
+   def _describe(self, responses: float, wire: float, body: float, decode: float) -> str:
+      return f"{responses:.0f} responses, {wire / 2**20:.2f} MiB on the wire, {body / 2**20:.2f} MiB decompressed, {decode * 1000:.0f} ms decoding"
+
+   def lines(self) -> list[str]:
+      with self._lock:
+         return [f"{method_id}: {self._describe(*totals)}" for method_id, totals in sorted(self.by_method.items())]
+
+   def __repr__(self) -> str:
+      with self._lock:
+         return self._describe(*(sum(totals[i] for totals in self.by_method.values()) for i in range(4)))
@@ -1,12 +1,13 @@
 import os
+import sys
 import base64
 import hashlib
 import json
 import typing as t
+import math
+from array import array
 from bisect import bisect_left
 
-import wcwidth
-
 T = t.TypeVar("T")
 
 DEBUG = False
@@ -27,6 +28,33 @@ def oopen(path: str):
 
    return open(path, "r+", encoding="utf-8")
 
+def atomic_write(path: str, text: str):
+   """
+   Either the old contents or all of text, never half of it.
+   """
+   directory = os.path.dirname(path)
+   if directory != "":
+      os.makedirs(directory, exist_ok=True)
+   with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+      f.write(text)
+   os.replace(f"{path}.tmp", path)
+
+def intern(s: T) -> T:
+   """
+   sys.intern for strs, anything else (None, mostly) goes through as is. For
+   strings that many tracks share, like channel names, or that several objects
+   hold for the same track, like ids.
+   """
+   return sys.intern(s) if type(s) is str else s
+
+def intern_column(column: t.Iterable[t.Optional[str]]) -> list[t.Optional[str]]:
+   """
+   intern for every one of column, paying for each distinct value only once.
+   """
+   column = list(column)
+   canonical = {s: intern(s) for s in set(column)}
+   return list(map(canonical.__getitem__, column))
+
 def deserialize(s: str):
    return json.loads(s)
 
@@ -40,80 +68,179 @@ def deserialize_raw(s: str, _: t.Optional[t.Type[T]] = None) -> tuple[T, str]:
 
 JSONDecodeError = json.JSONDecodeError
 
-def better_width(s: str) -> int:
+_WIDTH_PAGE = 256
+_WIDTH_TABLE_SIZE = 0x20000
+_width_increments = array("d", [math.nan]) * _WIDTH_TABLE_SIZE
+"""
+How much each codepoint adds to raw_width, NaN until its page has been
+measured. Measuring all of it up front takes most of a second, so pages of 256
+codepoints are filled in the first time something on them shows up. Covers the
+BMP and the emoji plane, everything above is measured on the spot.
+"""
+
+def _width_increment(cp: int) -> float:
+   if cp >= _WIDTH_TABLE_SIZE:
+      return _width_increment_of(chr(cp))
+
+   if math.isnan(_width_increments[cp]):
+      start = cp - cp % _WIDTH_PAGE
+      for other in range(start, start + _WIDTH_PAGE):
+         _width_increments[other] = _width_increment_of(chr(other))
+   return _width_increments[cp]
+
+def _width_increment_of(c: str) -> float:
+   import wcwidth
+
+   w = wcwidth.wcwidth(c)
+   if w == 1:
+      return 1
+   else:
+      return w * 0.9
+
+def _prefix_widths(s: str) -> list[float]:
+   """
+   prefix[k] is raw_width(s[:k])
+   """
+   prefix = [0.0] * (len(s) + 1)
+   length = 0.0
+   for i, c in enumerate(s):
+      length += _width_increment(ord(c))
+      prefix[i + 1] = length
+   return prefix
+
+def raw_width(s: str) -> float:
+   if s.isascii() and s.isprintable():
+      return float(len(s))
+
+   # Adding up left to right keeps the float rounding identical to measuring
+   # one character at a time.
    length = 0.0
-   for c in s:
-      w = wcwidth.wcwidth(c)
-      if w == 1:
-         length += 1
-      else:
-         length += w * 0.9
-   return int(length)
+   increments = _width_increments
+   try:
+      for c in s:
+         length += increments[ord(c)]
+   except IndexError:
+      # Something past the emoji plane, which isn't in the table.
+      return _prefix_widths(s)[-1]
+
+   if math.isnan(length):
+      # NaN sticks, so something in here was on a page we haven't measured yet.
+      return _prefix_widths(s)[-1]
+   return length
+
+
+def better_width(s: str) -> int:
+   return int(raw_width(s))
+
+
+def padding(width: float, max_width: int) -> int:
+   """
+   How many spaces it takes for something raw_width wide to be max_width wide.
+   """
+   if width.is_integer():
+      return max(0, max_width - int(width))
+
+   # Measuring a padded string adds 1 for every space, one at a time. Do the
+   # same here so that the rounding of the fractional widths matches exactly.
+   spaces = 0
+   while int(width) < max_width:
+      width += 1
+      spaces += 1
+   if int(width) > max_width and spaces > 0:
+      spaces -= 1
+   return spaces
 
 
 def left_align(lst: list[str]):
-   max_width = max(map(better_width, lst))
+   if len(lst) == 0:
+      return
+
+   widths = list(map(raw_width, lst))
+   max_width = max(map(int, widths))
    for i, s in enumerate(lst):
-      s_in_progress = s
-      while better_width(s_in_progress) < max_width:
-         s_in_progress += " "
-      if better_width(s_in_progress) > max_width:
-         s_in_progress = s_in_progress[:-1]
-      lst[i] = s_in_progress
+      lst[i] = s + " " * padding(widths[i], max_width)
 
 
 def truncate(s: str, max_len: int) -> str:
    if better_width(s) <= max_len:
       return s
 
-   while better_width(s) > max_len - 1:
-      s = s[:-1]
-   return s + "…"
+   # Chop off characters from the end until there's room for the ellipsis.
+   prefix = _prefix_widths(s)
+   keep = len(s)
+   while keep > 0 and int(prefix[keep]) > max_len - 1:
+      keep -= 1
+   return s[:keep] + "…"
 
 
 def smol_hash(s: str) -> str:
    return base64.b32encode(hashlib.sha256(s.encode()).digest()).decode()[:10]
 
-def longest_increasing_subsequence(unsorted: list[int]) -> list[int]:
-   if len(unsorted) < 2:
-      return unsorted
-
-   best_sublists: list[list[int]] = [[unsorted[0]]]
+def longest_increasing_subsequence_indices(unsorted: list[int]) -> list[int]:
+   """
+   Indices into unsorted of a longest strictly increasing subsequence.
+   O(n log n) time, O(n) memory.
+   """
+   if len(unsorted) == 0:
+      return []
 
-   # This is simply a convenience variable which always mirrors the last element
-   # of best_sublists. That is:
-   # ∀ i ∈ indexof best_sublists. best_sublists[i][-1] = best_sublists_ending[i]
-   #
    # Invariant:
-   # ∀ i,j ∈ indexof best_sublists_ending where i < j.
-   #     best_sublists_ending[i] < best_sublists_ending[j]
-   #
-   # We update best_sublists_ending[i] from x₁ to x₂ IFF x₂ < x₁.
+   # ∀ i,j ∈ indexof best_ending where i < j.
+   #     unsorted[best_ending[i]] < unsorted[best_ending[j]]
    #
-   # The list comprehension is for illustrative purposes.
-   best_sublists_ending: list[int] = [sublist[-1] for sublist in best_sublists]
+   # best_ending[i] is the index of the smallest value that ends an increasing
+   # subsequence of length i + 1. best_ending_values mirrors it for bisect.
+   best_ending: list[int] = [0]
+   best_ending_values: list[int] = [unsorted[0]]
+
+   # Instead of copying the whole subsequence whenever it grows, every index
+   # remembers the index that came before it at the time it was placed.
+   predecessor: list[int] = [-1] * len(unsorted)
+
+   for i in range(1, len(unsorted)):
+      x2 = unsorted[i]
+      belongs = bisect_left(best_ending_values, x2)
+
+      if belongs == len(best_ending_values):
+         predecessor[i] = best_ending[-1]
+         best_ending.append(i)
+         best_ending_values.append(x2)
+         continue
 
-   for x2 in unsorted[1:]:
-      belongs = bisect_left(best_sublists_ending, x2)
+      # We update best_ending[belongs] from x₁ to x₂ IFF x₂ < x₁.
+      if x2 < best_ending_values[belongs]:
+         predecessor[i] = best_ending[belongs - 1] if belongs > 0 else -1
+         best_ending[belongs] = i
+         best_ending_values[belongs] = x2
+
+   indices = [0] * len(best_ending)
+   i = best_ending[-1]
+   for k in range(len(indices) - 1, -1, -1):
+      indices[k] = i
+      i = predecessor[i]
+   return indices
 
-      if belongs == len(best_sublists_ending):
-         best_sublists_ending.append(x2)
-         best_sublists.append(best_sublists[-1] + [x2])
-         continue
 
-      x1 = best_sublists_ending[belongs]
-      if x2 < x1:
-         best_sublists_ending[belongs] = x2
-         best_sublists[belongs] = best_sublists_ending[:belongs] + [x2]
+def longest_increasing_subsequence(unsorted: list[int]) -> list[int]:
+   if len(unsorted) < 2:
+      return unsorted
 
-   return best_sublists[-1]
+   return [unsorted[i] for i in longest_increasing_subsequence_indices(unsorted)]
 
 
 def shortest_out_of_order_sublist(unsorted: list[int]) -> list[int]:
-   in_order = longest_increasing_subsequence(unsorted)
-   return [x for x in unsorted if x not in in_order]
+   in_order = set(longest_increasing_subsequence_indices(unsorted))
+   return [x for i, x in enumerate(unsorted) if i not in in_order]
 
 def overwrite(f: t.Any, text: str):
    f.seek(0)
    f.write(text)
    f.truncate()
+
+def overwrite_with(f: t.Any, write: t.Callable[[t.Any], t.Any]):
+   """
+   Like overwrite, but lets write stream straight into f.
+   """
+   f.seek(0)
+   write(f)
+   f.truncate()
@@ -1,18 +1,23 @@
 from __future__ import annotations
 
 import os
+import time
+import threading
 import typing as t
-from functools import cached_property
-
-import googleapiclient.discovery
-from google.oauth2.credentials import Credentials
+from functools import cache
 
 if t.TYPE_CHECKING:
    import googleapiclient._apis.youtube.v3 as YT
+   import transport
+   from google.oauth2.credentials import Credentials
+   from google.auth.credentials import Credentials as BaseCredentials
+   from google_auth_httplib2 import AuthorizedHttp
 
 import util as u
 import log as l
+import spans
 import config
+import quota
 
 missing_client_secrets = """
 You are missing a client secret file.
@@ -29,6 +34,8 @@ def _secret_filename() -> str:
    raise ValueError(missing_client_secrets)
 
 def _credentials() -> Credentials:
+   from google.oauth2.credentials import Credentials
+
    creds = None
    if os.path.exists(config.TOKEN_PATH):
       creds = Credentials.from_authorized_user_file(
@@ -62,17 +69,132 @@ def _credentials() -> Credentials:
 #
 # sybau
 os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
-try:
-   yt: YT.YouTubeResource = googleapiclient.discovery.build(
-      "youtube",
-      "v3",
-      credentials=_credentials(),
-   )
-except Exception as e:
-   if f"{e}".find("Unauthorized"):
-      print(e)
-      print("This can happen when the Client Secret is outdated.")
-      exit(1)
+
+# Logging in and building the client both take a while, and plenty of things
+# (analyzing a shadow file, the menu itself) never talk to YouTube at all.
+_lazy_lock = threading.Lock()
+_creds: t.Optional[BaseCredentials] = None
+_yt: t.Optional[YT.YouTubeResource] = None
+
+def _client() -> YT.YouTubeResource:
+   global _creds, _yt
+   with _lazy_lock:
+      if _yt is not None:
+         return _yt
+
+      import googleapiclient.discovery
+
+      if config.API_ENDPOINT is not None:
+         # Something like fakeyt, which doesn't care who we are.
+         from google.auth.credentials import AnonymousCredentials
+
+         _creds = AnonymousCredentials()
+         _yt = googleapiclient.discovery.build(
+            "youtube",
+            "v3",
+            credentials=_creds,
+            static_discovery=True,
+            client_options={"api_endpoint": config.API_ENDPOINT},
+         )
+         return _yt
+
+      try:
+         _creds = _credentials()
+         # The discovery document comes from the copy bundled with the client
+         # library rather than being fetched.
+         _yt = googleapiclient.discovery.build(
+            "youtube",
+            "v3",
+            credentials=_creds,
+            static_discovery=True,
+         )
+      except Exception as e:
+         if "Unauthorized" in str(e):
+            print(e)
+            print("This can happen when the Client Secret is outdated.")
+            exit(1)
+         raise
+      return _yt
+
+_http_lock = threading.Lock()
+_pool: t.Optional[transport.PooledHttp] = None
+_authorized: t.Optional[AuthorizedHttp] = None
+
+def _http() -> AuthorizedHttp:
+   """
+   Shared by every thread. httplib2 connections are not thread-safe, so the pool
+   underneath lends each request connections of its own.
+   """
+   global _pool, _authorized
+   with _http_lock:
+      if _authorized is None:
+         import transport
+         from googleapiclient.http import build_http
+         from google_auth_httplib2 import AuthorizedHttp
+
+         _client()
+         _pool = transport.PooledHttp(build_http, size=config.HTTP_POOL_SIZE, keep_alive=config.HTTP_KEEP_ALIVE)
+         _authorized = AuthorizedHttp(_creds, http=transport.ConditionalHttp(transport.MeteredHttp(_pool), response_cache()))
+      return _authorized
+
+def pool() -> t.Optional[transport.PooledHttp]:
+   """
+   None until something has talked to YouTube.
+   """
+   return _pool
+
+@cache
+def response_cache() -> transport.DiskCache:
+   """
+   Shared by every thread. Most pages of a playlist that changed haven't.
+   """
+   import transport
+
+   return transport.DiskCache(f"{config.PLAYLISTS_PATH}/.http-cache", max_bytes=config.HTTP_CACHE_MAX_BYTES)
+
+@cache
+def traffic() -> transport.Traffic:
+   import transport
+
+   return transport.Traffic()
+
+def _execute(req) -> t.Any:
+   from googleapiclient.errors import HttpError
+   import transport
+
+   quota.charge(quota.cost_of(req.methodId))
+   try:
+      with spans.span(req.methodId) as span:
+         http = _http()
+         wire_before = transport.wire_bytes()
+         decode = req.postproc
+
+         def measured_decode(response: t.Any, content: bytes) -> t.Any:
+            start = time.perf_counter()
+            try:
+               return decode(response, content)
+            finally:
+               wire = transport.wire_bytes() - wire_before
+               traffic().record(req.methodId, wire, len(content), time.perf_counter() - start)
+               span.args.update(wire_bytes=wire, body_bytes=len(content))
+
+         req.postproc = measured_decode
+         return req.execute(http=http)
+   except HttpError as e:
+      if "quotaExceeded" in f"{e}":
+         quota.exhausted()
+      raise
+
+# Partial responses, with only what PlaylistItem and Playlist read. Thumbnails
+# in five sizes and descriptions are most of what YouTube would send otherwise.
+ITEM_FIELDS = "id,snippet(title,position,playlistId,resourceId/videoId,videoOwnerChannelTitle)"
+PLAYLIST_FIELDS = "id,etag,contentDetails/itemCount,snippet(publishedAt,channelId,channelTitle,title)"
+
+def _fields(mask: str) -> t.Optional[str]:
+   return mask if config.PARTIAL_RESPONSES else None
+
+def _page_fields(mask: str) -> t.Optional[str]:
+   return _fields(f"etag,nextPageToken,items({mask})")
 
 class Thumbnails:
    def __init__(self, yt_thumbnails: YT.ThumbnailDetails):
@@ -95,6 +217,9 @@ class Thumbnails:
       return f"Thumbnails{self.present}"
 
 class PlaylistItem:
+   # There's one of these for every track in every playlist, so no __dict__.
+   __slots__ = ("is_private", "id", "title", "position", "playlist_id", "video_id", "channel_title")
+
    def __init__(self, yt_playlistitem: YT.PlaylistItem):
       self.is_private = False
 
@@ -103,28 +228,31 @@ class PlaylistItem:
 
       self.title: str = snippet["title"]
       self.position: int = snippet["position"]
-      self.playlist_id: str = snippet["playlistId"]
-      self.video_id: str = snippet["resourceId"]["videoId"]
+      self.playlist_id: str = u.intern(snippet["playlistId"])
+      self.video_id: str = u.intern(snippet["resourceId"]["videoId"])
 
       try:
-         self.channel_title: t.Optional[str] = snippet["videoOwnerChannelTitle"]
+         self.channel_title: t.Optional[str] = u.intern(snippet["videoOwnerChannelTitle"])
       except Exception as e:
-         l.debug("An exception occurred during translation from YT.PlaylistItem")
-         l.debug(e)
-         l.group_start()
-         l.debug("YT.PlaylistItem was:")
-
-         l.group_start()
-         l.debug(yt_playlistitem)
-         l.group_end()
-
-         l.debug("Proceeding under the assumption that the video is private.")
-         l.group_end()
+         # Private videos come by the hundred, so don't even group unless it shows.
+         if l.enabled(l.DEBUG):
+            l.debug("An exception occurred during translation from YT.PlaylistItem")
+            l.debug(e)
+            l.group_start()
+            l.debug("YT.PlaylistItem was:")
+
+            l.group_start()
+            l.debug(yt_playlistitem)
+            l.group_end()
+
+            l.debug("Proceeding under the assumption that the video is private.")
+            l.group_end()
          self.channel_title = None
 
    def set_position(self, position: int):
-      req = yt.playlistItems().update(
+      req = _client().playlistItems().update(
          part="snippet",
+         fields=_fields("id"),
          body={
             "id": self.id,
             "snippet": {
@@ -137,7 +265,24 @@ class PlaylistItem:
             },
          },
       )
-      req.execute()
+      _execute(req)
+
+   def delete(self):
+      _execute(_client().playlistItems().delete(id=self.id))
+
+   def dump(self) -> YT.PlaylistItem:
+      """
+      Just enough of the YT.PlaylistItem to make this again.
+      """
+      snippet: t.Any = {
+         "title": self.title,
+         "position": self.position,
+         "playlistId": self.playlist_id,
+         "resourceId": {"videoId": self.video_id},
+      }
+      if self.channel_title is not None:
+         snippet["videoOwnerChannelTitle"] = self.channel_title
+      return {"id": self.id, "snippet": snippet}
 
    def __repr__(self) -> str:
       return f"{self.title} - {self.channel_title}"
@@ -146,6 +291,12 @@ class PlaylistItem:
 class Playlist:
    def __init__(self, yt_playlist: YT.Playlist):
       self.id: str = yt_playlist["id"]
+      self.etag: t.Optional[str] = yt_playlist.get("etag")
+      """
+      Of the playlist resource. YouTube doesn't promise that it changes with the
+      items, so snapshot.unchanged_items only trusts it together with the item
+      count, as a heuristic.
+      """
       self.length: int = yt_playlist["contentDetails"]["itemCount"]
 
       snippet = yt_playlist["snippet"]
@@ -153,52 +304,214 @@ class Playlist:
       self.channel_id: str = snippet["channelId"]
       self.channel_title: str = snippet["channelTitle"]
       self.title: str = snippet["title"]
-      self.desc: str = snippet["description"]
-
-      self.thumbnails: YT.ThumbnailDetails = snippet["thumbnails"]
+      # Not asked for with config.PARTIAL_RESPONSES, since nothing reads them.
+      self.desc: str = snippet.get("description", "")
+      self.thumbnails: YT.ThumbnailDetails = snippet.get("thumbnails", {})
+
+      # Items arrive a page at a time, possibly on another thread, see iter_items().
+      self._arrived = threading.Condition()
+      self._items: list[PlaylistItem] = []
+      """
+      Every item that has arrived so far, in order.
+      """
+      self._fetching = False
+      self._fetched = False
+      self._fetch_error: t.Optional[BaseException] = None
+
+   def dump(self) -> YT.Playlist:
+      """
+      Just enough of the YT.Playlist to make this again.
+      """
+      return {
+         "id": self.id,
+         "etag": self.etag,
+         "contentDetails": {"itemCount": self.length},
+         "snippet": {
+            "publishedAt": self.published_at,
+            "channelId": self.channel_id,
+            "channelTitle": self.channel_title,
+            "title": self.title,
+            "description": self.desc,
+            "thumbnails": self.thumbnails,
+         },
+      }
 
-   @cached_property
+   def insert(self, video_id: str, position: int) -> PlaylistItem:
+      """
+      Adds video_id so that it lands at exactly position. Doesn't touch items.
+      """
+      req = _client().playlistItems().insert(
+         part="snippet",
+         fields=_fields(ITEM_FIELDS),
+         body={
+            "snippet": {
+               "playlistId": self.id,
+               "position": position,
+               "resourceId": {
+                  "kind": "youtube#video",
+                  "videoId": video_id,
+               },
+            },
+         },
+      )
+      return PlaylistItem(_execute(req))
+
+   @property
+   def fetch_cost(self) -> int:
+      """
+      Quota units it takes to fetch every item, 50 to a page.
+      """
+      return max(1, -(-self.length // 50)) * quota.COSTS["list"]
+
+   @property
+   def fetched(self) -> bool:
+      """
+      Whether every item is here.
+      """
+      return self._fetched
+
+   @property
    def items(self) -> list[PlaylistItem]:
+      self.fetch_items()
+      return self._items
+
+   @items.setter
+   def items(self, items: list[PlaylistItem]):
+      with self._arrived:
+         self._items = items
+         self._fetched = True
+         self._arrived.notify_all()
+
+   def _claim_fetch(self) -> bool:
+      """
+      Whether the caller gets to do the fetching.
+      """
+      with self._arrived:
+         if self._fetching or self._fetched:
+            return False
+         self._fetching = True
+         self._fetch_error = None
+         self._items = []
+         return True
+
+   def _fetch(self):
+      try:
+         for run in self._runs():
+            with self._arrived:
+               self._items.extend(run)
+               self._arrived.notify_all()
+      except BaseException as e:
+         with self._arrived:
+            self._fetch_error = e
+            self._fetching = False
+            self._arrived.notify_all()
+         raise
+
+      with self._arrived:
+         self._fetched = True
+         self._fetching = False
+         self._arrived.notify_all()
+
+   def _fetch_in_background(self):
+      try:
+         self._fetch()
+      except BaseException:
+         # Whoever is iterating gets it.
+         pass
+
+   def fetch_items(self):
+      """
+      Returns once every item is here, fetching them unless another thread
+      already is.
+      """
+      if self._claim_fetch():
+         self._fetch()
+         return
+      for _ in self.iter_items():
+         pass
+
+   def iter_items(self) -> t.Iterator[PlaylistItem]:
+      """
+      Items in order, each as soon as it and everything before it have arrived,
+      while the rest are still being fetched. Starts fetching them in the
+      background unless something already is.
+      """
+      if self._claim_fetch():
+         threading.Thread(target=self._fetch_in_background, name=f"items of {self.id}", daemon=True).start()
+
+      i = 0
+      while True:
+         with self._arrived:
+            while i >= len(self._items) and not self._fetched:
+               if self._fetch_error is not None:
+                  raise self._fetch_error
+               self._arrived.wait()
+            run = self._items[i:]
+         if len(run) == 0:
+            return
+         yield from run
+         i += len(run)
+
+   def _runs(self) -> t.Iterator[list[PlaylistItem]]:
+      """
+      Runs of items in order, each as soon as the page that completes it arrives.
+      """
       page_token = None
-      accumulate = {} # stupidass API doesn't return it to us in order...
+      pending: dict[int, t.Any] = {} # stupidass API doesn't return it to us in order...
+      position = 0 # of the first item that hasn't been yielded yet
 
       l.debug(self.title)
-      l.group_start()
+      l.group_start("yt.Playlist.items", title=self.title)
+      debug = l.enabled(l.DEBUG)
 
-      while True:
-         req = yt.playlistItems().list(
-            playlistId=self.id,
-            part="id,snippet",
-            maxResults=50,
-            pageToken=page_token,
-         )
-         res = req.execute()
-         items = res["items"]
-         for item in items:
-            position = item["snippet"]["position"]
-            accumulate[position] = item
-            l.debug(item["snippet"]["title"])
-            item_playlist_id = item["snippet"]["playlistId"]
-            if item_playlist_id != self.id:
-               print(
-                  f"ERROR  | Playlist Item belongs to {item_playlist_id} when it should belong to {self.id}"
-               )
-
-         before = len(accumulate)
-         after = len(accumulate)
-         l.debug(f"Playlist Item [{before:>3}, {after:>3}]")
-         page_token = res.get("nextPageToken")
-         if page_token is None:
-            break
-
-      output = [PlaylistItem(accumulate[i]) for i in range(0, len(accumulate))]
-      l.group_end()
-      return output
+      try:
+         while True:
+            req = _client().playlistItems().list(
+               playlistId=self.id,
+               part="id,snippet",
+               fields=_page_fields(ITEM_FIELDS),
+               maxResults=50,
+               pageToken=page_token,
+            )
+            res = _execute(req)
+            # Partial responses leave out items altogether when there are none.
+            for item in res.get("items", []):
+               item_position = item["snippet"]["position"]
+               if item_position < position:
+                  l.warn(f"YouTube sent item {item_position} of {self.title} twice, ignoring the second one")
+                  continue
+               pending[item_position] = item
+               if debug:
+                  l.debug(item["snippet"]["title"])
+               item_playlist_id = item["snippet"]["playlistId"]
+               if item_playlist_id != self.id:
+                  print(
+                     f"ERROR  | Playlist Item belongs to {item_playlist_id} when it should belong to {self.id}"
+                  )
+
+            before = position
+            run = []
+            while position in pending:
+               run.append(PlaylistItem(pending.pop(position)))
+               position += 1
+            after = position
+            l.debug(lambda: f"Playlist Item [{before:>3}, {after:>3}]")
+            if len(run) > 0:
+               yield run
+
+            page_token = res.get("nextPageToken")
+            if page_token is None:
+               break
+      finally:
+         l.group_end()
+
+      if len(pending) > 0:
+         raise LookupError(f"YouTube never sent item {position} of {u.serialize(self.title)}!")
 
 
 def get_playlist(id: str) -> Playlist:
-   res = yt.playlists().list(part="snippet,contentDetails", id=id).execute()
-   items = res["items"]
+   res = _execute(_client().playlists().list(part="snippet,contentDetails", fields=_page_fields(PLAYLIST_FIELDS), id=id))
+   items = res.get("items", [])
    if len(items) == 0:
       raise LookupError(f"Could not find playlist id {u.serialize(id)}!")
    return Playlist(items[0])
@@ -208,19 +521,20 @@ def my_playlists() -> list[Playlist]:
    yt_playlists = []
 
    l.debug("Fetching Playlists:")
-   l.group_start()
+   l.group_start("yt.my_playlists")
    while True:
-      req = yt.playlists().list(
+      req = _client().playlists().list(
          part="snippet,contentDetails",
+         fields=_page_fields(PLAYLIST_FIELDS),
          maxResults=50,
          mine=True,
          pageToken=page_token,
       )
-      res = req.execute()
+      res = _execute(req)
       before = len(yt_playlists)
-      yt_playlists.extend(res["items"])
+      yt_playlists.extend(res.get("items", []))
       after = len(yt_playlists)
-      l.debug(f"Playlist [{before:>2}, {after:>2}]")
+      l.debug(lambda: f"Playlist [{before:>2}, {after:>2}]")
       page_token = res.get("nextPageToken")
       if page_token is None:
          break
@@ -0,0 +1,38 @@
+import pytest
+import typing as t
+import yt
+
+def _yt_playlist(n: int) -> yt.Playlist:
+   playlist = yt.Playlist({
+      "id": "PL",
+      "contentDetails": {"itemCount": n},
+      "snippet": {
+         "publishedAt": "2025-01-01T00:00:00Z",
+         "channelId": "UC",
+         "channelTitle": "me",
+         "title": "My Great Playlist",
+         "description": "",
+         "thumbnails": {},
+      },
+   })
+   playlist.items = [
+      yt.PlaylistItem({
+         "id": f"item{i}",
+         "snippet": {
+            "title": f"Track {i}",
+            "position": i,
+            "playlistId": "PL",
+            "resourceId": {"videoId": f"video{i}"},
+            "videoOwnerChannelTitle": "aespa",
+         },
+      })
+      for i in range(n)
+   ]
+   return playlist
+
+@pytest.fixture
+def yt_playlist() -> t.Callable[[int], yt.Playlist]:
+   """
+   Makes a playlist of n tracks, "Track 0" to "Track n - 1" by aespa.
+   """
+   return _yt_playlist
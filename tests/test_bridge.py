@@ -0,0 +1,76 @@
+import colorama as c
+
+import bridge
+import config
+import log as l
+import snapshot
+import textual
+
+def _ingest(tmp_path, monkeypatch, capsys, yt_playlist, n: int, shadow_order: list[int]) -> tuple[list[int], list[str]]:
+   """
+   Ingests a YouTube playlist of n tracks into a shadow of the tracks in
+   shadow_order. Returns the tracks in the shadow afterwards and what was logged
+   about them.
+   """
+   monkeypatch.setattr(config, "PLAYLISTS_PATH", str(tmp_path))
+   monkeypatch.setattr(config, "OFFLINE", True)
+   monkeypatch.setattr(config, "LOG_LEVEL", l.INFO)
+
+   playlist = yt_playlist(n)
+   snapshot.save(playlist)
+   shadow = textual.Playlist(playlist)
+   shadow.items = [shadow.items[i] for i in shadow_order]
+   (tmp_path / "shadow.jsonl").write_text(shadow.jsonl(), encoding="utf-8")
+
+   l.flush()
+   capsys.readouterr()
+   p = bridge.Playlist(playlist_filepath=str(tmp_path / "shadow.jsonl"))
+   p.ingest_new_yt()
+   p.close()
+   l.flush()
+   logged = [
+      line.partition(c.Style.RESET_ALL)[2].lstrip(" |")
+      for line in capsys.readouterr().err.splitlines()
+      if " <- " in line
+   ]
+
+   again = bridge.Playlist(playlist_filepath=str(tmp_path / "shadow.jsonl"))
+   order = [int(item.video_id.removeprefix("video")) for item in again.shadow_file_object.items]
+   again.close()
+   return order, logged
+
+def test_ingest_at_head(tmp_path, monkeypatch, capsys, yt_playlist):
+   order, logged = _ingest(tmp_path, monkeypatch, capsys, yt_playlist, 4, [1, 2, 3])
+   assert order == [0, 1, 2, 3]
+   assert logged == ["$ <- Track 0 - aespa"]
+
+def test_ingest_chain(tmp_path, monkeypatch, capsys, yt_playlist):
+   # 2 goes after 1, which is in the shadow, and 3 after 2, which wasn't.
+   order, logged = _ingest(tmp_path, monkeypatch, capsys, yt_playlist, 6, [0, 1, 4, 5])
+   assert order == [0, 1, 2, 3, 4, 5]
+   assert logged == [
+      "Track 1 - aespa <- Track 2 - aespa",
+      "Track 2 - aespa <- Track 3 - aespa",
+   ]
+
+def test_ingest_chain_at_head(tmp_path, monkeypatch, capsys, yt_playlist):
+   order, logged = _ingest(tmp_path, monkeypatch, capsys, yt_playlist, 4, [2, 3])
+   assert order == [0, 1, 2, 3]
+   assert logged == [
+      "$ <- Track 0 - aespa",
+      "Track 0 - aespa <- Track 1 - aespa",
+   ]
+
+def test_ingest_into_reordered_shadow(tmp_path, monkeypatch, capsys, yt_playlist):
+   # New tracks follow their YouTube predecessor wherever the shadow put it.
+   order, logged = _ingest(tmp_path, monkeypatch, capsys, yt_playlist, 5, [3, 0, 1])
+   assert order == [3, 4, 0, 1, 2]
+   assert logged == [
+      "Track 1 - aespa <- Track 2 - aespa",
+      "Track 3 - aespa <- Track 4 - aespa",
+   ]
+
+def test_ingest_nothing_new(tmp_path, monkeypatch, capsys, yt_playlist):
+   order, logged = _ingest(tmp_path, monkeypatch, capsys, yt_playlist, 3, [2, 0, 1])
+   assert order == [2, 0, 1]
+   assert logged == []
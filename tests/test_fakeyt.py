@@ -0,0 +1,307 @@
+import os
+import pytest
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+from googleapiclient.errors import HttpError
+
+import bridge
+import config
+import fakeyt
+import journal
+import main
+import quota
+import snapshot
+import textual
+import transport
+import util as u
+import yt
+
+@pytest.fixture
+def fake(tmp_path, monkeypatch):
+   monkeypatch.setattr(config, "PLAYLISTS_PATH", str(tmp_path))
+   monkeypatch.setattr(quota, "_day", None)
+   monkeypatch.setattr(yt, "_yt", None)
+   monkeypatch.setattr(yt, "_creds", None)
+   monkeypatch.setattr(yt, "_pool", None)
+   monkeypatch.setattr(yt, "_authorized", None)
+   yt.response_cache.cache_clear()
+   yt.traffic.cache_clear()
+   for cached in (bridge._videos_file, bridge.videos, bridge._index_file, bridge.playlist_index):
+      cached.cache_clear()
+   with fakeyt.FakeYouTube() as fake:
+      monkeypatch.setattr(config, "API_ENDPOINT", fake.start())
+      yield fake
+   yt.response_cache.cache_clear()
+
+def test_fetch(fake):
+   video_ids = [fake.add_video(f"Song {i}", f"Channel {i % 3}") for i in range(120)]
+   video_ids.append(fake.add_video("Gone", None))
+   playlist_id = fake.add_playlist("Mix", video_ids)
+   fake.add_playlist("Other")
+
+   assert [playlist.title for playlist in yt.my_playlists()] == ["Mix", "Other"]
+   playlist = yt.get_playlist(playlist_id)
+   assert playlist.length == 121
+
+   items = playlist.items
+   assert [item.video_id for item in items] == video_ids
+   assert [item.position for item in items] == list(range(121))
+   assert items[1].title == "Song 1" and items[1].channel_title == "Channel 1"
+   assert items[-1].channel_title is None
+   # 3 pages of items, 2 of playlists
+   assert fake.requests == {"youtube.playlists.list": 2, "youtube.playlistItems.list": 3}
+   assert quota.used() == fake.quota_used == 5
+
+   with pytest.raises(LookupError):
+      yt.get_playlist("PLnope")
+
+def test_edits(fake):
+   a, b, c, d = [fake.add_video(name) for name in "abcd"]
+   playlist_id = fake.add_playlist("Mix", [a, b, c])
+   playlist = yt.get_playlist(playlist_id)
+   items = playlist.items
+
+   items[2].set_position(0)
+   assert fake.video_ids(playlist_id) == [c, a, b]
+   items[0].delete()
+   assert fake.video_ids(playlist_id) == [c, b]
+   inserted = playlist.insert(d, 1)
+   assert inserted.video_id == d and inserted.position == 1
+   assert fake.video_ids(playlist_id) == [c, d, b]
+   assert quota.used() == fake.quota_used == 2 + 3 * 50
+
+def test_not_modified(fake):
+   playlist_id = fake.add_playlist("Mix", [fake.add_video(f"Song {i}") for i in range(10)])
+   first = yt.get_playlist(playlist_id)
+   again = yt.get_playlist(playlist_id)
+   assert yt.response_cache().hits == 1
+   assert again.etag == first.etag
+
+   fake.add_playlist("Other")
+   fake.fail_next(503)
+   with pytest.raises(HttpError) as e:
+      yt.get_playlist(playlist_id)
+   assert e.value.status_code == 503
+
+def test_quota_exceeded(fake):
+   playlist_id = fake.add_playlist("Mix")
+   fake.fail_next("quotaExceeded")
+   with pytest.raises(HttpError) as e:
+      yt.get_playlist(playlist_id)
+   assert e.value.status_code == 403
+   assert quota.remaining() == 0
+
+def test_iter_items(fake):
+   video_ids = [fake.add_video(f"Song {i}") for i in range(230)]
+   playlist_id = fake.add_playlist("Mix", video_ids)
+   fake.shuffle = 80
+   fake.latency = 0.02
+   playlist = yt.get_playlist(playlist_id)
+
+   items = playlist.iter_items()
+   first = next(items)
+   assert first.video_id == video_ids[0]
+   assert not playlist.fetched
+   rest = list(items)
+   assert playlist.fetched
+   assert [item.video_id for item in [first, *rest]] == video_ids
+   assert [item.position for item in [first, *rest]] == list(range(230))
+   assert playlist.items[0] is first
+   assert fake.requests["youtube.playlistItems.list"] == 5
+
+def test_iter_items_fails(fake):
+   playlist_id = fake.add_playlist("Mix", [fake.add_video(f"Song {i}") for i in range(60)])
+   playlist = yt.get_playlist(playlist_id)
+   fake.fail_next(500)
+   with pytest.raises(HttpError):
+      list(playlist.iter_items())
+   assert not playlist.fetched
+   assert len(playlist.items) == 60
+
+def test_partial_responses(fake, monkeypatch):
+   video_ids = [fake.add_video(f"Song {i}", "Channel") for i in range(100)]
+   playlist_id = fake.add_playlist("Mix", video_ids)
+
+   def fetch():
+      yt.traffic.cache_clear()
+      playlist = yt.get_playlist(playlist_id)
+      items = [(item.id, item.title, item.position, item.playlist_id, item.video_id, item.channel_title) for item in playlist.items]
+      return playlist, items, yt.traffic().by_method["youtube.playlistItems.list"]
+
+   monkeypatch.setattr(config, "PARTIAL_RESPONSES", False)
+   full, full_items, (responses, full_wire, full_body, _) = fetch()
+   monkeypatch.setattr(config, "PARTIAL_RESPONSES", True)
+   partial, partial_items, (_, partial_wire, partial_body, _) = fetch()
+
+   assert responses == 2
+   assert partial_items == full_items
+   assert partial.etag == full.etag and partial.length == full.length and partial.title == full.title
+   assert partial.thumbnails == {} and full.thumbnails != {}
+   # Compressed, and then some.
+   assert full_wire < full_body
+   assert partial_body * 3 < full_body
+   assert partial_wire * 2 < full_wire
+
+def test_pooled_connections(fake, monkeypatch):
+   monkeypatch.setattr(config, "HTTP_POOL_SIZE", 3)
+   fake.latency = 0.005
+   playlist_ids = [fake.add_playlist(f"Mix {i}", [fake.add_video(f"Song {i}.{j}") for j in range(120)]) for i in range(12)]
+   opened = transport.connections_opened()
+
+   def fetch_and_move(playlist_id: str) -> list[str]:
+      playlist = yt.get_playlist(playlist_id)
+      playlist.items[-1].set_position(0)
+      return [item.video_id for item in playlist.items]
+
+   with ThreadPoolExecutor(max_workers=8) as pool:
+      fetched = list(pool.map(fetch_and_move, playlist_ids))
+
+   for playlist_id, video_ids in zip(playlist_ids, fetched):
+      assert fake.video_ids(playlist_id) == [video_ids[-1]] + video_ids[:-1]
+   # 60 requests over no more connections than the pool has room for
+   assert sum(fake.requests.values()) == 12 * 5
+   assert transport.connections_opened() - opened <= 3
+   assert yt.pool().created <= 3 and yt.pool().waits > 0
+
+def test_stop_iterating_early(fake, monkeypatch):
+   monkeypatch.setattr(config, "FETCH_WORKERS", 1)
+   fake.latency = 0.02
+   for i in range(10):
+      fake.add_playlist(f"Mix {i}", [fake.add_video(f"Song {i}.{j}") for j in range(3)])
+
+   playlists = bridge.iter_playlists_online()
+   next(playlists)
+   playlists.close()
+   # The one being fetched, maybe the one after, but not all of them.
+   assert fake.requests["youtube.playlistItems.list"] <= 2
+
+def test_unchanged_playlist_keeps_sync_time(fake):
+   playlist_id = fake.add_playlist("Mix", [fake.add_video(f"Song {i}") for i in range(3)])
+   main.full(main.analyze)
+   # As if that was a long time ago.
+   path = f"{config.PLAYLISTS_PATH}/.snapshots/{playlist_id}.json"
+   with open(path, encoding="utf-8") as f:
+      snap = u.deserialize(f.read())
+   snap["time"] = 1000.0
+   u.atomic_write(path, u.serialize(snap))
+   os.utime(path, (1000.0, 1000.0))
+   fetches = fake.requests["youtube.playlistItems.list"]
+
+   main.full(main.analyze)
+   assert fake.requests["youtube.playlistItems.list"] == fetches
+   # The items are still the ones from back then.
+   assert snapshot.synced_at(playlist_id) == 1000.0
+   assert snapshot.load(playlist_id, ttl=config.SNAPSHOT_TTL) is None
+
+def test_reorder_keeps_etag(fake):
+   video_ids = [fake.add_video(f"Song {i}") for i in range(3)]
+   playlist_id = fake.add_playlist("Mix", video_ids)
+   main.full(main.analyze)
+   yt.get_playlist(playlist_id).items[2].set_position(0)
+   fetches = fake.requests["youtube.playlistItems.list"]
+
+   # The known miss of the etag heuristic: same etag, same count, so the
+   # snapshot's order is taken as YouTube's until it is fetched again.
+   [p] = bridge.iter_playlists_online()
+   assert fake.requests["youtube.playlistItems.list"] == fetches
+   assert [item.video_id for item in p.yt_playlist.items] == video_ids
+   assert fake.video_ids(playlist_id) == [video_ids[2], *video_ids[:2]]
+
+def _synced(fake: fakeyt.FakeYouTube, n: int) -> tuple[str, list[str], str]:
+   """
+   A playlist of n songs, synced once. Returns its id, its video ids and the
+   path of its shadow.
+   """
+   video_ids = [fake.add_video(f"Song {i}") for i in range(n)]
+   playlist_id = fake.add_playlist("Mix", video_ids)
+   [p] = bridge.iter_playlists_online()
+   assert p.diff_ok
+   p.close()
+   return playlist_id, video_ids, p.shadow_file.name
+
+def _edit(path: str, video_ids: list[str]) -> bridge.Playlist:
+   """
+   Rewrites the shadow at path to have video_ids in that order, the way
+   someone editing it by hand would, and opens it again.
+   """
+   p = bridge.Playlist(playlist_filepath=path)
+   by_video = {item.video_id: item for item in p.shadow_file_object.items}
+   p.shadow_file_object.items = [
+      by_video.get(video_id) or textual.PlaylistItem((f"New {video_id}", "Some Channel", video_id, u.smol_hash(video_id)))
+      for video_id in video_ids
+   ]
+   p.write()
+   p.close()
+   return bridge.Playlist(playlist_filepath=path)
+
+def _writes(fake: fakeyt.FakeYouTube) -> int:
+   return sum(fake.requests.get(f"youtube.playlistItems.{method}", 0) for method in ("insert", "update", "delete"))
+
+def _check_pushed(playlist_id: str, path: str, expected: list[str]):
+   assert journal.Journal.load(playlist_id) is None
+   # The snapshot is what YouTube has, and the shadow knows the inserted
+   # tracks are there, so there's nothing left to push.
+   again = bridge.Playlist(playlist_filepath=path)
+   assert [item.video_id for item in again.yt_playlist.items] == expected
+   assert again.diff_ok and again.plan_push() == []
+   again.close()
+
+def test_push(fake):
+   playlist_id, (a, b, c, d, e), path = _synced(fake, 5)
+   x, y = fake.add_video("X"), fake.add_video("Y")
+   target = [e, a, x, c, y, d]
+   p = _edit(path, target)
+
+   shown = []
+   p.push(lambda changes: shown.append(changes) or True)
+   p.close()
+   assert shown == [["- Song 1 - Some Channel", "+ New " + x + " - Some Channel", "+ New " + y + " - Some Channel"]]
+   assert fake.video_ids(playlist_id) == target
+   assert fake.requests["youtube.playlistItems.insert"] == 2 and fake.requests["youtube.playlistItems.delete"] == 1
+   _check_pushed(playlist_id, path, target)
+
+def test_push_nothing(fake, tmp_path):
+   playlist_id, video_ids, path = _synced(fake, 3)
+   p = _edit(path, video_ids)
+   p.push(lambda _: pytest.fail("Nothing to confirm"))
+   p.close()
+   assert _writes(fake) == 0
+   assert not os.path.exists(tmp_path / ".push")
+
+def test_push_declined(fake, tmp_path):
+   playlist_id, (a, b, c), path = _synced(fake, 3)
+   p = _edit(path, [c, a, fake.add_video("X")])
+   p.push(lambda _: False)
+   p.close()
+   assert fake.video_ids(playlist_id) == [a, b, c]
+   assert _writes(fake) == 0
+   assert not os.path.exists(tmp_path / ".push")
+
+def test_push_resumes(fake, monkeypatch):
+   playlist_id, (a, b, c, d, e), path = _synced(fake, 5)
+   x, y = fake.add_video("X"), fake.add_video("Y")
+   target = [e, a, x, c, y, d]
+
+   # Dies right after YouTube took the third write, before it's marked.
+   mark = journal.Journal.mark
+   def dying_mark(self: journal.Journal, i: int, created: t.Optional[str] = None):
+      if i == 2:
+         raise KeyboardInterrupt()
+      mark(self, i, created)
+   monkeypatch.setattr(journal.Journal, "mark", dying_mark)
+   p = _edit(path, target)
+   with pytest.raises(KeyboardInterrupt):
+      p.push()
+   p.close()
+   assert _writes(fake) == 3
+   assert journal.Journal.load(playlist_id) is not None
+   monkeypatch.setattr(journal.Journal, "mark", mark)
+
+   # Nothing was confirmed the first time, so there's nothing to confirm now.
+   p = bridge.Playlist(playlist_filepath=path)
+   p.push(lambda _: pytest.fail("Resuming shouldn't ask again"))
+   p.close()
+   assert fake.video_ids(playlist_id) == target
+   # Every op exactly once.
+   assert _writes(fake) == 4
+   _check_pushed(playlist_id, path, target)
@@ -0,0 +1,42 @@
+import index
+import textual
+
+def _playlist(id_: str, rows: list[tuple[str, str]]) -> textual.Playlist:
+   return textual.Playlist(
+      f'"{id_} title"\n"{id_}"\n0.0\n'
+      + "".join(f'["title", "channel", "{video_id}", "{smol}"]\n' for video_id, smol in rows)
+   )
+
+def test_index_queries():
+   idx = index.Index()
+   assert idx.update(_playlist("PL1", [("v1", "S1"), ("v2", "S2")]))
+   assert idx.update(_playlist("PL2", [("v2", "S3"), ("v3", "S4"), ("v3", "S5")]))
+   assert not idx.update(_playlist("PL2", [("v2", "S3"), ("v3", "S4"), ("v3", "S5")]))
+
+   assert idx.containing("v1") == [("PL1", 0)]
+   assert idx.containing("v4") == []
+   assert idx.locate("S4") == [("PL2", 1)]
+   assert idx.title("PL2") == "PL2 title"
+   assert idx.duplicates() == {"v2": [("PL1", 1), ("PL2", 0)], "v3": [("PL2", 1), ("PL2", 2)]}
+
+   idx.update(_playlist("PL2", [("v3", "S4")]))
+   assert idx.duplicates() == {}
+   assert idx.containing("v2") == [("PL1", 1)]
+   assert idx.locate("S3") == []
+
+def test_index_log():
+   idx = index.Index()
+   idx.update(_playlist("PL1", [("v1", "S1")]))
+   idx.update(_playlist("PL2", [("v1", "S2")]))
+   log = idx.pending_jsonl()
+   assert idx.pending_jsonl() == ""
+
+   idx.update(_playlist("PL1", [("v2", "S1")]))
+   log += idx.pending_jsonl()
+   assert idx.garbage_ratio == 1 / 3
+
+   reloaded = index.Index(log)
+   assert reloaded.records == 3
+   assert reloaded.duplicates() == {}
+   assert reloaded.containing("v2") == [("PL1", 0)]
+   assert index.Index(reloaded.compact_jsonl()).records == 2
@@ -0,0 +1,57 @@
+import config
+import journal
+import plan
+
+def test_resume(tmp_path, monkeypatch):
+   monkeypatch.setattr(config, "PLAYLISTS_PATH", str(tmp_path))
+   start = ["a", "b", "c", "d", "e"]
+   target = ["e", "d", "c", "b", "a"]
+   ops = plan.plan_edits(start, target)
+   assert journal.Journal.load("PL") is None
+
+   pending = journal.Journal.begin("PL", start, ops)
+   pending.mark(0)
+   pending.mark(1)
+
+   resumed = journal.Journal.load("PL")
+   assert resumed is not None
+   assert resumed.start == start and resumed.ops == ops and resumed.done == 2
+
+   # Died before the third op.
+   assert resumed.resume_point(plan.simulate(start, ops[:2])) == 2
+   # Someone reordered things by hand in the meantime.
+   assert resumed.resume_point(["b", "a", "c", "d", "e"]) is None
+   # Died after the third op but before marking it.
+   assert resumed.resume_point(plan.simulate(start, ops[:3])) == 3
+   assert journal.Journal.load("PL").done == 3
+
+   resumed.finish()
+   assert journal.Journal.load("PL") is None
+
+def test_resume_inserts_and_deletes(tmp_path, monkeypatch):
+   monkeypatch.setattr(config, "PLAYLISTS_PATH", str(tmp_path))
+   start = ["a", "b", "c"]
+   ops = plan.plan_edits(start, ["+0", "c", "a", "+3"])
+   assert ops == [plan.Delete("b"), plan.Move("a", 1), plan.Insert("+0", 0), plan.Insert("+3", 3)]
+
+   pending = journal.Journal.begin("PL", start, ops)
+   pending.mark(0)
+   pending.mark(1)
+   pending.mark(2, "new0")
+
+   resumed = journal.Journal.load("PL")
+   assert resumed.created == {"+0": "new0"}
+   assert resumed.resume_point(["new0", "c", "a"]) == 3
+   # The last insert went through, but we never heard back.
+   assert resumed.resume_point(["new0", "c", "a", "new3"]) == 4
+   assert resumed.result() == ["new0", "c", "a", "new3"]
+   assert resumed.placeholders(["new0", "c", "a", "new3"]) == ["+0", "c", "a", "+3"]
+   assert journal.Journal.load("PL").created == {"+0": "new0", "+3": "new3"}
+
+def test_torn_mark(tmp_path, monkeypatch):
+   monkeypatch.setattr(config, "PLAYLISTS_PATH", str(tmp_path))
+   pending = journal.Journal.begin("PL", ["a", "b", "c"], [plan.Move("c", 0), plan.Move("b", 0)])
+   pending.mark(0)
+   with open(tmp_path / ".push" / "PL.jsonl", "a") as f:
+      f.write("\0\0")
+   assert journal.Journal.load("PL").done == 1
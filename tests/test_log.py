@@ -0,0 +1,89 @@
+import json
+import time
+import threading
+
+import config
+import log as l
+
+def test_levels(capsys, monkeypatch):
+   monkeypatch.setattr(config, "LOG_LEVEL", l.INFO)
+   called = []
+   l.debug(lambda: called.append("debug"))
+   l.info(lambda: called.append("info") or "made")
+   l.flush()
+   assert called == ["info"]
+   err = capsys.readouterr().err
+   assert "made" in err and "DBG" not in err
+
+   monkeypatch.setattr(config, "LOG_LEVEL", l.ERROR)
+   l.warn("hidden")
+   l.error("shown")
+   l.flush()
+   err = capsys.readouterr().err
+   assert "hidden" not in err and "shown" in err
+
+def test_buffered(monkeypatch):
+   monkeypatch.setattr(config, "LOG_FLUSH_INTERVAL", 60)
+   out = []
+   sink = l._Sink(out.append, lambda: None)
+   sink.write("a")
+   sink.write("b")
+   assert out == []
+   sink.flush()
+   assert out == ["ab"]
+   # Too much to sit on.
+   sink.write("c" * 100_000)
+   assert out == ["ab", "c" * 100_000]
+
+   monkeypatch.setattr(config, "LOG_FLUSH_INTERVAL", 0.01)
+   out.clear()
+   sink = l._Sink(out.append, lambda: None)
+   sink.write("later")
+   time.sleep(0.2)
+   assert out == ["later"]
+
+def test_json_lines(tmp_path, monkeypatch):
+   monkeypatch.setattr(config, "LOG_JSON_PATH", str(tmp_path / "log.jsonl"))
+   l.info("plain")
+   l.group_start("stage")
+   l.warn({"some": ["dict"]})
+   l.group_end()
+   l.info(object())
+   l.flush()
+   f = l._json_file
+   sink = l._json
+   monkeypatch.setattr(config, "LOG_JSON_PATH", None)
+   l.info("not there")
+   l.flush()
+   assert f is not None and f.closed
+   assert sink is not None and sink._flusher is not None and not sink._flusher.is_alive()
+
+   with open(tmp_path / "log.jsonl", encoding="utf-8") as f:
+      records = [json.loads(line) for line in f]
+   assert [r["level"] for r in records] == ["info", "warn", "info"]
+   assert records[0]["message"] == "plain" and records[0]["span"] is None
+   assert records[1]["message"] == {"some": ["dict"]} and records[1]["span"] == "stage"
+   assert records[1]["depth"] == records[0]["depth"] + 1
+   assert records[2]["message"].startswith("<object object")
+
+def test_groups_per_thread(capsys, monkeypatch):
+   monkeypatch.setattr(config, "LOG_LEVEL", l.INFO)
+   started = threading.Event()
+   done = threading.Event()
+
+   def worker():
+      l.group_start()
+      l.group_start()
+      started.set()
+      done.wait()
+      l.group_end()
+      l.group_end()
+
+   thread = threading.Thread(target=worker)
+   thread.start()
+   started.wait()
+   l.info("main")
+   done.set()
+   thread.join()
+   l.flush()
+   assert " |  main" not in capsys.readouterr().err
@@ -0,0 +1,59 @@
+import random
+
+import plan
+import util
+
+def test_simulate():
+   assert plan.simulate(["a", "b", "c"], [plan.Move("a", 2)]) == ["b", "c", "a"]
+   assert plan.simulate(["a", "b", "c"], [plan.Move("c", 0)]) == ["c", "a", "b"]
+   assert plan.simulate(["a", "b", "c"], [plan.Move("b", 1)]) == ["a", "b", "c"]
+
+def test_plan_moves():
+   assert plan.plan_moves(["a", "b", "c"], ["a", "b", "c"]) == []
+   assert plan.plan_moves(["a", "b", "c"], ["c", "a", "b"]) == [plan.Move("c", 0)]
+   assert plan.plan_moves(["a", "b", "c", "d"], ["b", "a", "d", "c"]) == [plan.Move("a", 1), plan.Move("c", 3)]
+
+def test_plan_moves_random():
+   rng = random.Random(3)
+   for n in [0, 1, 2, 5, 30, 300]:
+      for _ in range(30):
+         current = list(range(n))
+         target = list(range(n))
+         rng.shuffle(target)
+         moves = plan.plan_moves(current, target)
+         assert plan.simulate(current, moves) == target
+         target_position = {x: i for i, x in enumerate(target)}
+         assert len(moves) == n - len(util.longest_increasing_subsequence([target_position[x] for x in current]))
+         assert plan.cost(moves) == len(moves) * plan.UPDATE_COST
+
+def test_plan_moves_rejects_different_items():
+   for current, target in [(["a"], ["b"]), (["a", "b"], ["a"]), (["a", "a"], ["a", "a"])]:
+      try:
+         plan.plan_moves(current, target)
+      except ValueError:
+         continue
+      assert False
+
+def test_plan_edits_random():
+   rng = random.Random(5)
+   for n in [0, 1, 2, 5, 30, 300]:
+      for _ in range(30):
+         current = [f"c{i}" for i in range(n)]
+         kept = [key for key in current if rng.random() < 0.8]
+         target = kept + [f"n{i}" for i in range(rng.randint(0, 5))]
+         rng.shuffle(target)
+         ops = plan.plan_edits(current, target)
+         assert plan.simulate(current, ops) == target
+
+         # Only what both have in common ever moves, and as little as possible.
+         target_position = {x: i for i, x in enumerate(target)}
+         common = [target_position[x] for x in current if x in target_position]
+         moves = [op for op in ops if isinstance(op, plan.Move)]
+         assert len(moves) == len(common) - len(util.longest_increasing_subsequence(common))
+         assert len(ops) - len(moves) == (n - len(kept)) + (len(target) - len(kept))
+         assert plan.cost(ops) == len(ops) * plan.UPDATE_COST
+
+def test_count():
+   assert plan.count([]) == "nothing"
+   assert plan.count([plan.Move("a", 0)]) == "1 move"
+   assert plan.count([plan.Insert("a", 0), plan.Delete("b"), plan.Move("c", 0), plan.Move("d", 0)]) == "1 insert, 1 delete and 2 moves"
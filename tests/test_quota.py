@@ -0,0 +1,46 @@
+import config
+import quota
+
+def _fresh(tmp_path, monkeypatch, today="2026-10-18"):
+   monkeypatch.setattr(config, "PLAYLISTS_PATH", str(tmp_path))
+   monkeypatch.setattr(quota, "_day", None)
+   monkeypatch.setattr(quota, "_today", lambda: today)
+
+def test_charge_persists_per_day(tmp_path, monkeypatch):
+   _fresh(tmp_path, monkeypatch)
+   assert quota.cost_of("youtube.playlistItems.list") == 1
+   assert quota.cost_of("youtube.playlistItems.update") == 50
+
+   quota.charge(1)
+   quota.charge(50)
+   assert quota.used() == 51
+   assert quota.remaining() == config.QUOTA_PER_DAY - 51
+
+   _fresh(tmp_path, monkeypatch)
+   assert quota.used() == 51
+
+   _fresh(tmp_path, monkeypatch, today="2026-10-19")
+   assert quota.used() == 0
+
+   quota.exhausted()
+   assert quota.remaining() == 0
+
+def test_require(tmp_path, monkeypatch):
+   _fresh(tmp_path, monkeypatch)
+   quota.charge(config.QUOTA_PER_DAY - 100)
+   quota.require(100, "Pushing")
+   try:
+      quota.require(101, "Pushing")
+   except ValueError:
+      return
+   assert False
+
+def test_schedule(tmp_path, monkeypatch):
+   _fresh(tmp_path, monkeypatch)
+   quota.charge(config.QUOTA_PER_DAY - 10)
+
+   # (name, cost, last done)
+   jobs = [("a", 4, 30.0), ("b", 5, 10.0), ("c", 3, 20.0), ("d", 0, 40.0), ("e", 1, float("-inf"))]
+   run, deferred = quota.schedule(jobs, cost=lambda j: j[1], last_done=lambda j: j[2])
+   assert [j[0] for j in run] == ["b", "c", "d", "e"]
+   assert [j[0] for j in deferred] == ["a"]
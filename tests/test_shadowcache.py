@@ -0,0 +1,59 @@
+import os
+import hashlib
+import sys
+import config
+import shadowcache
+import textual
+import util as u
+
+SHADOW = """"My Great Playlist"
+// Check those shoes out playa
+"I hope you kept the receipt"
+11102.0
+// the good one
+["Aris Rage (Protect Your Ears)", "BasedMonster", "zbsbcKfqtSQ", "PTZI4WR47P"] // loud
+["Rich Man"                     , "aespa"       , "WAQ5_7YFAVo", "QXK2AMS8NV"]
+"""
+
+def test_warm_load_matches_parse(tmp_path, monkeypatch):
+   monkeypatch.setattr(config, "PLAYLISTS_PATH", str(tmp_path))
+   f = u.oopen(f"{tmp_path}/My Great Playlist - PTZI4WR47P.jsonl")
+   f.write(SHADOW)
+   f.flush()
+
+   sources = []
+   parse = textual.Playlist._parse
+   monkeypatch.setattr(textual.Playlist, "_parse", lambda self, source: sources.append(source) or parse(self, source))
+   cold = shadowcache.parse(f)
+   # Parsed from the file, not from all of it read into a str.
+   assert sources == [f]
+   assert os.path.exists(f"{tmp_path}/.parsed/My Great Playlist - PTZI4WR47P.marshal")
+   warm = shadowcache.parse(f)
+   assert len(sources) == 1
+   assert warm.dump() == cold.dump() == textual.Playlist(SHADOW).dump()
+   assert warm.jsonl() == textual.Playlist(SHADOW).jsonl()
+   # Interned strings have to stay interned through the cache.
+   assert warm.items[0].video_id is sys.intern("zbsbcKfqtSQ")
+   assert warm.items[1].friendly_channel_title is sys.intern("aespa")
+
+   # Same size, same mtime as far as anyone can tell, different contents.
+   stat = os.stat(f.name)
+   u.overwrite(f, SHADOW.replace("Rich Man", "Rich Mab"))
+   f.flush()
+   os.utime(f.name, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+   assert shadowcache.parse(f).items[1].friendly_title == "Rich Mab"
+
+def test_key_matches_whole_text(tmp_path):
+   # Hashed a bit at a time, the key is the same as the one of all of the text,
+   # so caches from before still count.
+   f = u.oopen(f"{tmp_path}/big.jsonl")
+   text = SHADOW * 5000
+   f.write(text)
+   f.flush()
+   assert shadowcache._key(f)[3] == hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+def test_dump_round_trips():
+   playlist = textual.Playlist(SHADOW)
+   again = textual.Playlist(playlist.dump())
+   assert again.jsonl() == playlist.jsonl()
+   assert [item.inline_comment for item in again.items] == [" // loud", ""]
@@ -0,0 +1,60 @@
+import bridge
+import config
+import snapshot
+import textual
+
+def test_snapshot_round_trip(tmp_path, monkeypatch, yt_playlist):
+   monkeypatch.setattr(config, "PLAYLISTS_PATH", str(tmp_path))
+   assert snapshot.load("PL") is None
+
+   snapshot.save(yt_playlist(3))
+   loaded = snapshot.load("PL", ttl=60)
+   assert loaded is not None
+   assert loaded.title == "My Great Playlist"
+   assert [(i.id, i.position, i.video_id, i.channel_title) for i in loaded.items] == [
+      (f"item{i}", i, f"video{i}", "aespa") for i in range(3)
+   ]
+   assert snapshot.load("PL", ttl=-1) is None
+
+def test_offline_analysis(tmp_path, monkeypatch, yt_playlist):
+   monkeypatch.setattr(config, "PLAYLISTS_PATH", str(tmp_path))
+   monkeypatch.setattr(config, "OFFLINE", True)
+
+   playlist = yt_playlist(4)
+   snapshot.save(playlist)
+   shadow = textual.Playlist(playlist)
+   shadow.items = [shadow.items[1], shadow.items[2], shadow.items[0]]
+   (tmp_path / "shadow.jsonl").write_text(shadow.jsonl(), encoding="utf-8")
+
+   p = bridge.Playlist(playlist_filepath=str(tmp_path / "shadow.jsonl"))
+   assert p.missing_from_yt == []
+   assert [i.id for i in p.missing_from_shadow] == ["item3"]
+   p.ingest_new_yt()
+   assert p.diff_ok
+   assert [i.id for i in p.ooo] == ["item0"]
+   p.close()
+
+def test_unchanged_items(tmp_path, monkeypatch, yt_playlist):
+   monkeypatch.setattr(config, "PLAYLISTS_PATH", str(tmp_path))
+
+   playlist = yt_playlist(2)
+   playlist.etag = "etag1"
+   assert snapshot.unchanged_items(playlist) is None
+   snapshot.save(playlist)
+
+   again = yt_playlist(2)
+   again.etag = "etag1"
+   unchanged = snapshot.unchanged_items(again)
+   assert unchanged is not None
+   assert [i.id for i in unchanged] == ["item0", "item1"]
+
+   again.etag = "etag2"
+   assert snapshot.unchanged_items(again) is None
+
+   again.etag = "etag1"
+   again.length = 3
+   assert snapshot.unchanged_items(again) is None
+
+   again.length = 2
+   again.etag = None
+   assert snapshot.unchanged_items(again) is None
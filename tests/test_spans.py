@@ -0,0 +1,81 @@
+import json
+import threading
+import time
+
+import config
+import log as l
+import spans
+
+def _by_name():
+   return {name: (calls, total, self_) for name, calls, total, self_ in spans.summary()}
+
+def test_nesting():
+   spans.reset()
+   with spans.span("outer"):
+      time.sleep(0.01)
+      for _ in range(2):
+         with spans.span("inner"):
+            time.sleep(0.01)
+
+   summary = _by_name()
+   assert summary["inner"][0] == 2
+   calls, total, self_ = summary["outer"]
+   assert calls == 1
+   assert total >= summary["inner"][1] + 10_000_000
+   assert self_ == total - summary["inner"][1]
+
+def test_groups():
+   spans.reset()
+   l.group_start("named", what=1)
+   l.group_start()
+   l.group_start("inner")
+   l.group_end()
+   l.group_end()
+   l.group_end()
+   assert set(_by_name()) == {"named", "inner"}
+
+def test_exception_ends_inner_spans():
+   spans.reset()
+
+   @spans.traced
+   def fails():
+      l.group_start("never ended")
+      raise ValueError()
+
+   try:
+      fails()
+   except ValueError:
+      pass
+   assert _by_name().keys() == {"never ended", f"{__name__}.test_exception_ends_inner_spans.<locals>.fails"}
+
+def test_chrome_trace(tmp_path, monkeypatch):
+   spans.reset()
+   monkeypatch.setattr(config, "TRACE_PATH", str(tmp_path / "trace.json"))
+   with spans.span("main"):
+      with spans.span("bridge.thing"):
+         pass
+   thread = threading.Thread(target=lambda: spans.end(spans.begin("yt.thing", page=2)), name="worker")
+   thread.start()
+   thread.join()
+   spans.report()
+
+   with open(tmp_path / "trace.json", encoding="utf-8") as f:
+      events = json.load(f)["traceEvents"]
+   complete = {e["name"]: e for e in events if e["ph"] == "X"}
+   assert complete.keys() == {"main", "bridge.thing", "yt.thing"}
+   assert complete["yt.thing"]["cat"] == "yt" and complete["yt.thing"]["args"] == {"page": 2}
+   assert complete["yt.thing"]["tid"] != complete["main"]["tid"]
+   assert complete["main"]["ts"] <= complete["bridge.thing"]["ts"]
+   assert complete["bridge.thing"]["dur"] <= complete["main"]["dur"]
+   assert "worker" in [e["args"]["name"] for e in events if e["ph"] == "M"]
+
+def test_report_to_bare_filename(tmp_path, monkeypatch):
+   spans.reset()
+   monkeypatch.chdir(tmp_path)
+   monkeypatch.setattr(config, "TRACE_PATH", "trace.json")
+   with spans.span("main"):
+      pass
+   spans.report()
+
+   with open(tmp_path / "trace.json", encoding="utf-8") as f:
+      assert "main" in [e["name"] for e in json.load(f)["traceEvents"]]
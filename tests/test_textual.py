@@ -1,4 +1,5 @@
 import textual
+import yt
 
 def test_playlist():
    txt1 = """"My Great Playlist"
@@ -7,6 +8,80 @@ def test_playlist():
       11102.0
       ["Aris Rage (Protect Your Ears)", "BasedMonster", "zbsbcKfqtSQ", "PTZI4WR47P"]
    """
-   pl1 = textual.FriendlyPlaylist(txt1)
+   pl1 = textual.Playlist(txt1)
    assert len(pl1.items) == 1
-   assert pl1.items[0].channel_title == "BasedMonster"
+   assert pl1.items[0].friendly_channel_title == "BasedMonster"
+
+def _yt_item(id: str, video_id: str, title: str) -> yt.PlaylistItem:
+   return yt.PlaylistItem({
+      "id": id,
+      "snippet": {
+         "title": title,
+         "position": 0,
+         "playlistId": "PL",
+         "resourceId": {"videoId": video_id},
+         "videoOwnerChannelTitle": "aespa",
+      },
+   })
+
+def test_videos_dedupes_log():
+   log = '["WAQ5_7YFAVo", "Rich", "aespa"]\n["zbsbcKfqtSQ", "Aris Rage", "BasedMonster"]\n["WAQ5_7YFAVo", "Rich Man", "aespa"]\n'
+   videos = textual.Videos(log)
+   assert len(videos) == 2
+   assert videos["WAQ5_7YFAVo"].title == "Rich Man"
+   assert videos.records == 3
+   assert videos.pending_jsonl() == ""
+
+def test_videos_appends_only_changes():
+   videos = textual.Videos('["WAQ5_7YFAVo", "Rich Man", "aespa"]\n')
+   videos.add([_yt_item("a", "WAQ5_7YFAVo", "Rich Man"), _yt_item("b", "zbsbcKfqtSQ", "Aris Rage")])
+   assert videos.pending_jsonl() == '["zbsbcKfqtSQ", "Aris Rage", "aespa"]\n'
+   assert videos.pending_jsonl() == ""
+
+   videos.add([_yt_item("b", "zbsbcKfqtSQ", "Aris Rage (Protect Your Ears)")])
+   assert len(videos) == 2
+   assert videos.garbage_ratio == 1 / 3
+   assert videos.pending_jsonl() == '["zbsbcKfqtSQ", "Aris Rage (Protect Your Ears)", "aespa"]\n'
+
+   compacted = videos.compact_jsonl()
+   assert compacted.count("\n") == 2
+   assert videos.garbage_ratio == 0
+   assert textual.Videos(compacted).jsonl() == compacted
+
+SHADOW = """"Mixed"
+"PLmixed"
+11102.0
+["Rich Man", "aespa", "WAQ5_7YFAVo", "QXK2AMS8NV"]
+// above
+["Aris Rage", null, "zbsbcKfqtSQ", "PTZI4WR47P"]  // inline
+["Armageddon", "aespa", "a0Gk0_mTj8Q", "EM1RNS7R5Q", "extra"]
+
+["Supernova", "aespa", "phuiiNCxRMg", "B4SPN9L1WU"]
+"""
+
+def test_playlist_from_file_matches_string(tmp_path):
+   path = tmp_path / "Mixed.jsonl"
+   path.write_text(SHADOW, encoding="utf-8")
+   with open(path, encoding="utf-8") as f:
+      from_file = textual.Playlist(f)
+   from_string = textual.Playlist(SHADOW)
+   assert from_file.dump() == from_string.dump()
+
+   assert [item.video_id for item in from_string.items] == ["WAQ5_7YFAVo", "zbsbcKfqtSQ", "a0Gk0_mTj8Q", "phuiiNCxRMg"]
+   assert from_string.items[1].above_comment == ["// above"]
+   assert from_string.items[1].inline_comment == "  // inline"
+   assert from_string.items[1].friendly_channel_title is None
+   assert textual.Playlist(from_string.jsonl()).dump() == from_string.dump()
+
+   # Every track gets one of these, so they're kept small.
+   assert not hasattr(from_string.items[0], "__dict__")
+   assert from_string.items[0].video_id is from_file.items[0].video_id
+
+def test_playlist_errors_name_the_line():
+   bad = SHADOW.replace('"B4SPN9L1WU"]', '"B4SPN9L1WU"] oops')
+   try:
+      textual.Playlist(bad)
+   except ValueError as e:
+      assert str(e) == "Line 9: Unexpected text \"oops\" after Supernova!"
+   else:
+      assert False
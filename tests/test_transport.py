@@ -0,0 +1,124 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httplib2
+
+import transport
+
+class _Pages(BaseHTTPRequestHandler):
+   pages = {"/a": (b'"a1"', b"page a"), "/b": (b'"b1"', b"page b " * 100)}
+   sent_if_none_match: list[str] = []
+
+   def do_GET(self):
+      etag, body = self.pages[self.path]
+      if_none_match = self.headers.get("If-None-Match")
+      if if_none_match is not None:
+         self.sent_if_none_match.append(if_none_match)
+      if if_none_match == etag.decode():
+         self.send_response(304)
+         self.send_header("ETag", etag.decode())
+         self.end_headers()
+         return
+      self.send_response(200)
+      self.send_header("ETag", etag.decode())
+      self.send_header("Content-Type", "application/json")
+      self.send_header("Content-Length", str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+   def log_message(self, *args):
+      pass
+
+def _serve():
+   server = ThreadingHTTPServer(("127.0.0.1", 0), _Pages)
+   threading.Thread(target=server.serve_forever, daemon=True).start()
+   return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def test_conditional_http(tmp_path):
+   server, root = _serve()
+   try:
+      cache = transport.DiskCache(str(tmp_path), max_bytes=1 << 20)
+      http = transport.ConditionalHttp(httplib2.Http(), cache)
+
+      response, content = http.request(f"{root}/a")
+      assert response.status == 200 and content == b"page a"
+      assert (cache.hits, cache.misses) == (0, 1)
+
+      response, content = http.request(f"{root}/a")
+      assert response.status == 200 and content == b"page a"
+      assert response.fromcache
+      assert (cache.hits, cache.misses) == (1, 1)
+      assert _Pages.sent_if_none_match == ['"a1"']
+
+      _Pages.pages["/a"] = (b'"a2"', b"page a, but different")
+      response, content = http.request(f"{root}/a")
+      assert content == b"page a, but different"
+      assert (cache.hits, cache.misses) == (1, 2)
+
+      # Survives being opened again
+      reopened = transport.DiskCache(str(tmp_path), max_bytes=1 << 20)
+      response, content = transport.ConditionalHttp(httplib2.Http(), reopened).request(f"{root}/a")
+      assert content == b"page a, but different" and reopened.hits == 1
+   finally:
+      server.shutdown()
+
+def test_disk_cache_eviction(tmp_path):
+   cache = transport.DiskCache(str(tmp_path), max_bytes=300)
+   cache.put("/1", transport.CachedResponse('"1"', {}, b"x" * 100))
+   cache.put("/2", transport.CachedResponse('"2"', {}, b"x" * 100))
+   assert cache.get("/1") is not None
+   cache.put("/3", transport.CachedResponse('"3"', {}, b"x" * 100))
+   assert cache.size <= 300
+   assert cache.get("/2") is None
+   assert cache.get("/1") is not None
+   assert cache.get("/3") is not None
+
+   cache.put("/huge", transport.CachedResponse('"h"', {}, b"x" * 1000))
+   assert cache.get("/huge") is None
+
+class _KeepAlive(BaseHTTPRequestHandler):
+   protocol_version = "HTTP/1.1"
+
+   def do_GET(self):
+      time.sleep(0.01)
+      self.send_response(200)
+      self.send_header("Content-Length", "2")
+      self.end_headers()
+      self.wfile.write(b"ok")
+
+   def log_message(self, *args):
+      pass
+
+def test_pooled_http():
+   server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAlive)
+   threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+   root = f"http://127.0.0.1:{server.server_address[1]}"
+   try:
+      pool = transport.PooledHttp(httplib2.Http, size=2, keep_alive=60)
+      http = transport.MeteredHttp(pool)
+      opened = transport.connections_opened()
+
+      def get(_):
+         return http.request(f"{root}/")[1]
+
+      threads = [threading.Thread(target=get, args=(i,)) for i in range(6)]
+      for thread in threads:
+         thread.start()
+      for thread in threads:
+         thread.join()
+      for i in range(4):
+         assert get(i) == b"ok"
+      assert pool.created == 2 and pool.waits > 0
+      assert transport.connections_opened() - opened == 2
+
+      pool.keep_alive = 0
+      time.sleep(0.01)
+      assert get(0) == b"ok"
+      assert pool.expired == 1
+      assert transport.connections_opened() - opened == 3
+
+      pool.close()
+      assert pool.created == 0
+   finally:
+      server.shutdown()
@@ -1,3 +1,8 @@
+import random
+from bisect import bisect_left
+
+import wcwidth
+
 import util
 
 def test_quote():
@@ -11,3 +16,110 @@ def test_deserialize_raw():
 def test_longest_increasing_sublist():
    assert util.longest_increasing_subsequence([1, 2]) == [1, 2]
    assert util.longest_increasing_subsequence([3, 4, 2, 9, 1]) == [3, 4, 9]
+
+def _old_longest_increasing_subsequence(unsorted: list[int]) -> list[int]:
+   # The list-copying implementation this module used to have.
+   if len(unsorted) < 2:
+      return unsorted
+
+   best_sublists: list[list[int]] = [[unsorted[0]]]
+   best_sublists_ending: list[int] = [unsorted[0]]
+   for x2 in unsorted[1:]:
+      belongs = bisect_left(best_sublists_ending, x2)
+      if belongs == len(best_sublists_ending):
+         best_sublists_ending.append(x2)
+         best_sublists.append(best_sublists[-1] + [x2])
+         continue
+      if x2 < best_sublists_ending[belongs]:
+         best_sublists_ending[belongs] = x2
+         best_sublists[belongs] = best_sublists_ending[:belongs] + [x2]
+   return best_sublists[-1]
+
+def _is_increasing_subsequence(sub: list[int], of: list[int]) -> bool:
+   it = iter(of)
+   return all(x in it for x in sub) and all(a < b for a, b in zip(sub, sub[1:]))
+
+def test_longest_increasing_sublist_matches_old():
+   rng = random.Random(1)
+   for n in [0, 1, 2, 3, 10, 50, 500]:
+      for _ in range(50):
+         perm = list(range(n))
+         rng.shuffle(perm)
+         new = util.longest_increasing_subsequence(perm)
+         old = _old_longest_increasing_subsequence(perm)
+         assert _is_increasing_subsequence(new, perm)
+         assert len(new) == len(old)
+         # The old implementation could splice together tails that were not in
+         # order, e.g. [2, 4, 6, 1, 5, 7] -> [1, 4, 5, 7]. Whenever it did
+         # produce a real subsequence, we must produce the very same one.
+         if _is_increasing_subsequence(old, perm):
+            assert new == old
+
+def test_shortest_out_of_order_sublist():
+   assert util.shortest_out_of_order_sublist([]) == []
+   assert util.shortest_out_of_order_sublist([0, 1, 2]) == []
+   assert util.shortest_out_of_order_sublist([2, 4, 6, 1, 5, 7]) == [6, 1]
+
+   rng = random.Random(2)
+   for _ in range(100):
+      perm = list(range(200))
+      rng.shuffle(perm)
+      ooo = util.shortest_out_of_order_sublist(perm)
+      in_order = [x for x in perm if x not in ooo]
+      assert _is_increasing_subsequence(in_order, perm)
+      assert len(in_order) == len(util.longest_increasing_subsequence(perm))
+
+def _old_left_align(lst: list[str]):
+   max_width = max(map(util.better_width, lst))
+   for i, s in enumerate(lst):
+      s_in_progress = s
+      while util.better_width(s_in_progress) < max_width:
+         s_in_progress += " "
+      if util.better_width(s_in_progress) > max_width:
+         s_in_progress = s_in_progress[:-1]
+      lst[i] = s_in_progress
+
+def test_left_align_matches_old():
+   alphabet = "abc XYZ\"\\\x07́​한국어日本語アニメ🎵🔥👍🏽ｆｕｌｌ"
+   rng = random.Random(4)
+   for _ in range(300):
+      col = ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 45))) for _ in range(rng.randint(1, 8))]
+      expected = list(col)
+      _old_left_align(expected)
+      util.left_align(col)
+      assert col == expected
+
+   empty: list[str] = []
+   util.left_align(empty)
+   assert empty == []
+
+def _old_better_width(s: str) -> int:
+   length = 0.0
+   for c in s:
+      w = wcwidth.wcwidth(c)
+      if w == 1:
+         length += 1
+      else:
+         length += w * 0.9
+   return int(length)
+
+def _old_truncate(s: str, max_len: int) -> str:
+   if _old_better_width(s) <= max_len:
+      return s
+   while _old_better_width(s) > max_len - 1:
+      s = s[:-1]
+   return s + "…"
+
+def test_width_table_matches_wcwidth():
+   for cp in [*range(0, 0x3000), *range(0xAC00, 0xAD00), *range(0x1F300, 0x1FA00), 0x10FFFF]:
+      c = chr(cp)
+      assert util.better_width(c) == _old_better_width(c), hex(cp)
+
+def test_truncate_matches_old():
+   alphabet = "abc XYZ\x07\u0301\u200b한국어日本語アニメ🎵🔥👍🏽ｆｕｌｌ"
+   rng = random.Random(6)
+   for _ in range(500):
+      s = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+      for max_len in [1, 5, 20, 40]:
+         assert util.better_width(s) == _old_better_width(s)
+         assert util.truncate(s, max_len) == _old_truncate(s, max_len)